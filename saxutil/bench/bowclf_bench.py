@@ -0,0 +1,220 @@
+"""
+End to end timings of bowclf training and inference on synthetic corpora
+of several sizes and vocabulary sizes. Each phase reports its throughput,
+p50 / p99 latency where it runs per document or per batch, and peak memory
+from a second, tracemalloc traced, run. Results are printed as json.
+
+Usage: python -m lib.saxutil.bench.bowclf_bench [--numdocs 1000 5000]
+    [--vocab-sizes 5000 20000] [--out results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from lib.saxutil import bowclf
+from lib.saxutil import mem_util
+from lib.saxutil.bench import synth_corpus
+
+
+def latency_stats(lats, numitems=None):
+    """
+    :type lats: list<float>
+    :param lats: seconds per call
+    :type numitems: int
+    :param numitems: items processed over all calls. Defaults to one per
+        call.
+    :rtype: dict<str, float>
+    """
+    lats = np.array(lats)
+    secs = float(lats.sum())
+    if numitems is None:
+        numitems = len(lats)
+    return {
+        'secs': secs,
+        'items_per_sec': numitems / secs if secs > 0 else None,
+        'p50_secs': float(np.percentile(lats, 50)),
+        'p99_secs': float(np.percentile(lats, 99)),
+    }
+
+
+def _timed(func, *args):
+    beg = time.perf_counter()
+    res = func(*args)
+    return res, time.perf_counter() - beg
+
+
+class _Phases(object):
+    """
+    Runs each phase once, timing it and, when "trace" is set, measuring
+    its peak memory instead.
+    """
+    def __init__(self, trace):
+        self.trace = trace
+        self.res_on_phase = {}
+
+    def run(self, phase, func, *args):
+        if self.trace:
+            res, peak = mem_util.traced_peak(func, *args)
+            self.res_on_phase[phase] = {'peak_bytes': peak}
+            return res
+        res, secs = _timed(func, *args)
+        self.res_on_phase[phase] = {'secs': secs}
+        return res
+
+    def add(self, phase, stats):
+        if not self.trace:
+            self.res_on_phase[phase] = stats
+
+
+def run_phases(
+    tkn_lil, lbls, trace=False, minfreq=2, numsingle=200, batch_size=100
+):
+    """
+    :type tkn_lil: list<list<str>>
+    :type lbls: list<obj>
+    :type trace: bool
+    :type minfreq: int
+    :param minfreq: features below this frequency are removed
+    :type numsingle: int
+    :param numsingle: documents predicted one at a time
+    :type batch_size: int
+    :rtype: dict<str, dict<str, float>>
+    """
+    ph = _Phases(trace)
+
+    def ingest():
+        trnr = bowclf.Trnr()
+        lats = []
+        for i in range(len(tkn_lil)):
+            beg = time.perf_counter()
+            trnr.add_obj_list_doc(tkn_lil[i], lbls[i])
+            lats.append(time.perf_counter() - beg)
+        return trnr, lats
+
+    trnr, lats = ph.run('ingest', ingest)
+    ph.add('ingest', latency_stats(lats))
+    lows = ph.run('fts_below_freq', trnr.fts_below_freq, minfreq)
+    ph.run('rm_fts', trnr.rm_fts, lows)
+    ph.run('score_fts', trnr.score_fts)
+    trnr.map_fts_to_cols()
+    clf = ph.run('to_clf', trnr.to_clf, LogisticRegression(max_iter=200))
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        dirpath = os.path.join(tmpdir, 'clf')
+        ph.run('serialize', bowclf.serialize_clf_to_dir, clf, dirpath)
+        clf = ph.run('load', bowclf.load_clf_from_dir, dirpath)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    def predict_single():
+        lats = []
+        for i in range(min(numsingle, len(tkn_lil))):
+            beg = time.perf_counter()
+            clf.clear()
+            clf.add_obj_list_doc(tkn_lil[i])
+            clf.predict()
+            lats.append(time.perf_counter() - beg)
+        return lats
+
+    lats = ph.run('predict_single', predict_single)
+    ph.add('predict_single', latency_stats(lats))
+
+    def predict_batch():
+        lats = []
+        for beg_ix in range(0, len(tkn_lil), batch_size):
+            beg = time.perf_counter()
+            clf.clear()
+            for tkns in tkn_lil[beg_ix:beg_ix + batch_size]:
+                clf.add_obj_list_doc(tkns)
+            clf.predict()
+            lats.append(time.perf_counter() - beg)
+        return lats
+
+    lats = ph.run('predict_batch', predict_batch)
+    ph.add('predict_batch', latency_stats(lats, len(tkn_lil)))
+    ph.res_on_phase['predict_batch']['batch_size'] = batch_size
+
+    for phase in ('fts_below_freq', 'rm_fts', 'score_fts', 'to_clf'):
+        if phase in ph.res_on_phase and not trace:
+            ph.res_on_phase[phase]['items_per_sec'] = (
+                len(tkn_lil) / ph.res_on_phase[phase]['secs']
+            )
+    return ph.res_on_phase
+
+
+def run(
+    numdocs_list=(1000, 5000,), vocab_sizes=(5000, 20000,), numlbls=4,
+    measure_mem=True, seed=0
+):
+    """
+    :type numdocs_list: tuple<int>
+    :type vocab_sizes: tuple<int>
+    :type numlbls: int
+    :type measure_mem: bool
+    :type seed: int
+    :rtype: dict
+    :returns: "runs" holds one entry per corpus and vocabulary size, with
+        the results of each phase. Throughput is in documents per second.
+    """
+    runs = []
+    for numdocs in numdocs_list:
+        for vocab_size in vocab_sizes:
+            tkn_lil, tag_lil = synth_corpus.synth_docs(
+                numdocs, vocab_size=vocab_size, seed=seed
+            )
+            lbls = np.random.RandomState(seed).randint(
+                0, numlbls, numdocs
+            ).tolist()
+            phases = run_phases(tkn_lil, lbls)
+            if measure_mem:
+                peaks = run_phases(tkn_lil, lbls, trace=True)
+                for phase, res in peaks.items():
+                    phases[phase]['peak_bytes'] = res['peak_bytes']
+            runs.append({
+                'numdocs': numdocs,
+                'vocab_size': vocab_size,
+                'numtkns': sum([len(d) for d in tkn_lil]),
+                'phases': phases,
+            })
+    return {
+        'meta': {
+            'numlbls': numlbls,
+            'seed': seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'runs': runs,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--numdocs', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument(
+        '--vocab-sizes', type=int, nargs='+', default=[5000, 20000]
+    )
+    parser.add_argument('--numlbls', type=int, default=4)
+    parser.add_argument('--no-mem', action='store_true')
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    res = run(
+        args.numdocs, args.vocab_sizes, args.numlbls, not args.no_mem
+    )
+    dta = json.dumps(res, indent=2, sort_keys=True)
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            f.write(dta)
+    print(dta)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
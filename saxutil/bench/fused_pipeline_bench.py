@@ -0,0 +1,60 @@
+"""
+Compare tkn_transform.run_pipeline with the same transformers compiled by
+tkn_transform.compile_pipeline.
+
+Usage: python -m lib.saxutil.bench.fused_pipeline_bench [numdocs]
+"""
+import sys
+import time
+from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.bench import synth_corpus
+
+
+def mk_pipe(flgset={'__NEG'}):
+    """
+    :type flgset: set<str>
+    :rtype: list<TransformBase>
+    """
+    return [
+        tkn_transform.LowerCaseReplacer(flgset),
+        tkn_transform.NumberReplacer(flgset),
+        tkn_transform.StopWordFilter({'the', 'a', 'of', 'and'}, flgset),
+        tkn_transform.NumberFilter(flgset),
+        tkn_transform.StemReplacer(flgset=flgset),
+    ]
+
+
+def run(numdocs=2000):
+    """
+    :type numdocs: int
+    :rtype: dict<str, float>
+    :returns: tokens per second for each way of running the pipeline
+    """
+    tkn_lil, tag_lil = synth_corpus.synth_docs(numdocs)
+    numtkns = sum([len(d) for d in tkn_lil])
+    pipe = mk_pipe()
+    fused = tkn_transform.compile_pipeline(pipe)
+
+    beg = time.perf_counter()
+    ref = [
+        tkn_transform.run_pipeline(pipe, tkn_lil[i], tag_lil[i])
+        for i in range(numdocs)
+    ]
+    secs_ref = time.perf_counter() - beg
+
+    beg = time.perf_counter()
+    res = [fused.run(tkn_lil[i], tag_lil[i]) for i in range(numdocs)]
+    secs_fused = time.perf_counter() - beg
+
+    if res != ref:
+        raise AssertionError('fused pipeline output differs')
+    return {
+        'run_pipeline': numtkns / secs_ref,
+        'compile_pipeline': numtkns / secs_fused,
+    }
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    for method, tps in sorted(run(*args).items()):
+        print(method + '\t' + '%.0f' % tps + ' tokens/sec')
@@ -0,0 +1,63 @@
+"""
+Compare mtx_util.mtx_from_col_lists with mtx_util.csr_from_col_lists on
+random column lists.
+
+Usage: python -m lib.saxutil.bench.mtx_util_bench [numrows [numcols]]
+"""
+import sys
+import time
+import numpy as np
+from lib.saxutil import mtx_util
+
+
+def rand_col_lists(numrows, numcols, mean_len=10, seed=0):
+    """
+    :type numrows: int
+    :type numcols: int
+    :type mean_len: int
+    :type seed: int
+    :rtype: list<list<int>>
+    """
+    rng = np.random.RandomState(seed)
+    lens = rng.poisson(mean_len, numrows)
+    cols = rng.randint(0, numcols, lens.sum())
+    offsets = np.concatenate([[0], np.cumsum(lens)])
+    return [
+        cols[offsets[i]:offsets[i + 1]].tolist() for i in range(numrows)
+    ]
+
+
+def time_method(method, *args):
+    beg = time.perf_counter()
+    res = method(*args)
+    return res, time.perf_counter() - beg
+
+
+def run(numrows=100000, numcols=50000, skip_lil_over=1000000):
+    """
+    :type numrows: int
+    :type numcols: int
+    :type skip_lil_over: int
+    :param skip_lil_over: the lil_matrix builder is not run when numrows is
+        larger than this. It takes too long on 10M row inputs.
+    :rtype: dict<str, float>
+    :returns: seconds spent in each method
+    """
+    col_lists = rand_col_lists(numrows, numcols)
+    secs_on_method = {}
+    csr, secs_on_method['csr_from_col_lists'] = time_method(
+        mtx_util.csr_from_col_lists, col_lists
+    )
+    if numrows <= skip_lil_over:
+        lil, secs_on_method['mtx_from_col_lists'] = time_method(
+            mtx_util.mtx_from_col_lists, col_lists
+        )
+        if (lil.tocsr() != csr).nnz != 0:
+            raise AssertionError('matrices differ')
+    return secs_on_method
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    for method, secs in sorted(run(*args).items()):
+        print(method + '\t' + '%.3f' % secs)
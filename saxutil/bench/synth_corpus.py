@@ -0,0 +1,77 @@
+"""
+Seeded synthetic corpora for the benchmarks in this directory.
+"""
+import numpy as np
+
+POS_TAGS = ('NN', 'NNS', 'VB', 'VBD', 'JJ', 'RB', 'DT', 'IN',)
+PUNCS = ('.', ',', '!', '?', '--', '(', ')', "'s", "n't",)
+
+
+def mk_vocab(numwords, seed=0):
+    """
+    Random lower case words of 2 to 10 letters, some capitalized.
+
+    :type numwords: int
+    :type seed: int
+    :rtype: list<str>
+    """
+    rng = np.random.RandomState(seed)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    vocab, seen = [], set()
+    while len(vocab) < numwords:
+        w = ''.join(letters[rng.randint(0, 26, rng.randint(2, 11))])
+        if rng.rand() < .1:
+            w = w.capitalize()
+        if w in seen:
+            continue
+        seen.add(w)
+        vocab.append(w)
+    return vocab
+
+
+def synth_docs(
+    numdocs, mean_doclen=200, vocab_size=20000, zipf_a=1.1, flag_density=.05,
+    number_density=.05, punc_density=.1, flgs=('__NEG',), seed=0
+):
+    """
+    Documents whose words follow a Zipfian distribution over a random
+    vocabulary, mixed with numbers, punctuation and flagged tokens.
+
+    :type numdocs: int
+    :type mean_doclen: int
+    :type vocab_size: int
+    :type zipf_a: float
+    :param zipf_a: Zipf exponent. Higher values repeat the top words more.
+    :type flag_density: float
+    :param flag_density: proportion of tokens with a flag from "flgs" added
+    :type number_density: float
+    :type punc_density: float
+    :type flgs: tuple<str>
+    :type seed: int
+    :rtype: tuple(list<list<str>>, list<list<str>>,)
+    :returns: token lists and matching POS tag lists
+    """
+    rng = np.random.RandomState(seed)
+    vocab = np.array(mk_vocab(vocab_size, seed))
+    ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+    probs = ranks ** -zipf_a
+    probs /= probs.sum()
+    tkn_lil, tag_lil = [], []
+    for d in range(numdocs):
+        doclen = max(1, rng.poisson(mean_doclen))
+        tkns = vocab[rng.choice(vocab_size, doclen, p=probs)].tolist()
+        kinds = rng.rand(doclen)
+        for i in range(doclen):
+            if kinds[i] < number_density:
+                if rng.rand() < .5:
+                    tkns[i] = str(rng.randint(0, 10000))
+                else:
+                    tkns[i] = '%.2f' % (rng.rand() * 100)
+            elif kinds[i] < number_density + punc_density:
+                tkns[i] = PUNCS[rng.randint(len(PUNCS))]
+        if len(flgs) > 0:
+            for i in np.nonzero(rng.rand(doclen) < flag_density)[0]:
+                tkns[i] += flgs[rng.randint(len(flgs))]
+        tkn_lil.append(tkns)
+        tag_lil.append([POS_TAGS[t] for t in rng.randint(0, 8, doclen)])
+    return tkn_lil, tag_lil
@@ -0,0 +1,264 @@
+"""
+Throughput and peak memory of each txt_proc transformer, of
+MatchGeneralizer and of a full run_pipeline, on a seeded synthetic corpus
+or on an NLTK corpus. Results can be saved as json and compared against a
+saved baseline.
+
+Usage: python -m lib.saxutil.bench.txt_proc_bench [--numdocs N]
+    [--nltk-corpus brown] [--out results.json] [--baseline baseline.json]
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+from lib.saxutil import mem_util
+from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.txt_proc import synonym
+from lib.saxutil.txt_proc.PuncFilter import PuncFilter, AbbrvFilter
+from lib.saxutil.bench import synth_corpus
+
+FLGSET = {'__NEG'}
+STOPWORDS = {'the', 'a', 'of', 'and', 'to', 'in'}
+
+
+def nltk_docs(name='brown', numdocs=None):
+    """
+    Tagged documents of an NLTK corpus, one per file id.
+
+    :type name: str
+    :param name: a tagged corpus in nltk.corpus. EG: 'brown', 'treebank'
+    :type numdocs: int
+    :rtype: tuple(list<list<str>>, list<list<str>>,)
+    """
+    import nltk
+    corpus = getattr(nltk.corpus, name)
+    tkn_lil, tag_lil = [], []
+    for fileid in corpus.fileids()[:numdocs]:
+        tagged = corpus.tagged_words(fileid)
+        tkn_lil.append([t[0] for t in tagged])
+        tag_lil.append([t[1] for t in tagged])
+    return tkn_lil, tag_lil
+
+
+def mk_match_generalizer(tkn_lil, numngrams=2000, seed=0):
+    """
+    A MatchGeneralizer mapping bigrams and trigrams taken from the corpus,
+    so that they occur in it, to single tokens.
+
+    :type tkn_lil: list<list<str>>
+    :type numngrams: int
+    :type seed: int
+    :rtype: synonym.MatchGeneralizer
+    """
+    rng = np.random.RandomState(seed)
+    mg = synonym.MatchGeneralizer(case_sensitive=True)
+    seen = set()
+    for k in range(numngrams):
+        tkns = tkn_lil[rng.randint(len(tkn_lil))]
+        n = rng.randint(2, 4)
+        if len(tkns) < n:
+            continue
+        beg = rng.randint(len(tkns) - n + 1)
+        ngram = tuple(tkns[beg:beg + n])
+        if ngram in seen:
+            continue
+        seen.add(ngram)
+        mg.add(ngram, ('__ngram' + str(len(seen)),))
+    return mg
+
+
+def mk_transformers(tkn_lil):
+    """
+    :type tkn_lil: list<list<str>>
+    :rtype: list<tuple(str, obj,)>
+    """
+    twp = tkn_transform.TermWithPosReplacer(FLGSET)
+    for tkn in ('the', 'a', 'of'):
+        twp.add_tkn_pos_transform(tkn, 'DT', tkn.upper())
+    return [
+        ('LowerCaseReplacer', tkn_transform.LowerCaseReplacer(FLGSET)),
+        ('StemReplacer', tkn_transform.StemReplacer(flgset=FLGSET)),
+        ('LemmaReplacer', tkn_transform.LemmaReplacer(FLGSET)),
+        ('NumberReplacer', tkn_transform.NumberReplacer(FLGSET)),
+        ('TermWithPosReplacer', twp),
+        ('StopWordFilter', tkn_transform.StopWordFilter(STOPWORDS, FLGSET)),
+        ('NumberFilter', tkn_transform.NumberFilter(FLGSET)),
+        ('PuncFilter', PuncFilter(FLGSET)),
+        ('AbbrvFilter', AbbrvFilter(FLGSET)),
+        ('MatchGeneralizer', tkn_transform.MatchGeneralizeTransformer(
+            mk_match_generalizer(tkn_lil)
+        )),
+    ]
+
+
+def mk_pipe(tkn_lil):
+    """
+    :type tkn_lil: list<list<str>>
+    :rtype: list<obj>
+    """
+    return [
+        tkn_transform.MatchGeneralizeTransformer(
+            mk_match_generalizer(tkn_lil)
+        ),
+        tkn_transform.LowerCaseReplacer(FLGSET),
+        PuncFilter(FLGSET),
+        AbbrvFilter(FLGSET),
+        tkn_transform.NumberReplacer(FLGSET),
+        tkn_transform.StopWordFilter(STOPWORDS, FLGSET),
+        tkn_transform.StemReplacer(flgset=FLGSET),
+    ]
+
+
+def _run_all(run, tkn_lil, tag_lil):
+    for i in range(len(tkn_lil)):
+        run(tkn_lil[i], tag_lil[i])
+
+
+def measure(run, tkn_lil, tag_lil, measure_mem=True):
+    """
+    :type run: function
+    :param run: called with each document's tokens and tags
+    :type tkn_lil: list<list<str>>
+    :type tag_lil: list<list<str>>
+    :type measure_mem: bool
+    :param measure_mem: run a second time under tracemalloc for the peak
+        memory. The timed run is not traced.
+    :rtype: dict<str, float>
+    """
+    numtkns = sum([len(d) for d in tkn_lil])
+    beg = time.perf_counter()
+    _run_all(run, tkn_lil, tag_lil)
+    secs = time.perf_counter() - beg
+    res = {'tkns_per_sec': numtkns / secs, 'secs': secs}
+    if measure_mem:
+        res['peak_bytes'] = mem_util.traced_peak(
+            _run_all, run, tkn_lil, tag_lil
+        )[1]
+    return res
+
+
+def run(
+    numdocs=1000, nltk_corpus=None, measure_mem=True, seed=0, **synth_args
+):
+    """
+    :type numdocs: int
+    :type nltk_corpus: str
+    :param nltk_corpus: name of a tagged NLTK corpus to use instead of a
+        synthetic one
+    :type measure_mem: bool
+    :type seed: int
+    :param synth_args: passed on to synth_corpus.synth_docs. EG:
+        flag_density, number_density, zipf_a
+    :rtype: dict
+    """
+    if nltk_corpus is None:
+        tkn_lil, tag_lil = synth_corpus.synth_docs(
+            numdocs, seed=seed, **synth_args
+        )
+    else:
+        tkn_lil, tag_lil = nltk_docs(nltk_corpus, numdocs)
+    results = {}
+    stages = mk_transformers(tkn_lil)
+    stages.append(('run_pipeline', mk_pipe(tkn_lil)))
+    for name, tr in stages:
+        if name == 'run_pipeline':
+            def run_doc(tkns, tags, pipe=tr):
+                return tkn_transform.run_pipeline(pipe, tkns, tags)
+        else:
+            run_doc = tr.run
+        try:
+            results[name] = measure(run_doc, tkn_lil, tag_lil, measure_mem)
+        except LookupError as e:
+            # an NLTK resource, such as WordNet, is not installed
+            lines = [l.strip(' *') for l in str(e).split('\n')]
+            results[name] = {'skipped': [l for l in lines if l][0]}
+    return {
+        'meta': {
+            'numdocs': len(tkn_lil),
+            'numtkns': sum([len(d) for d in tkn_lil]),
+            'corpus': nltk_corpus or 'synthetic',
+            'seed': seed,
+            'synth_args': synth_args,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(res, baseline, tolerance=.1):
+    """
+    :type res: dict
+    :param res: output of "run"
+    :type baseline: dict
+    :param baseline: output of an earlier "run" with the same arguments
+    :type tolerance: float
+    :param tolerance: allowed relative slowdown or memory growth
+    :rtype: list<str>
+    :returns: a description of each regression
+    """
+    regressions = []
+    for name, cur in sorted(res['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None or 'skipped' in cur or 'skipped' in base:
+            continue
+        if cur['tkns_per_sec'] < base['tkns_per_sec'] * (1.0 - tolerance):
+            regressions.append(
+                name + ': tokens/sec ' + '%.0f' % cur['tkns_per_sec'] +
+                ' < baseline ' + '%.0f' % base['tkns_per_sec']
+            )
+        if 'peak_bytes' in cur and 'peak_bytes' in base:
+            if cur['peak_bytes'] > base['peak_bytes'] * (1.0 + tolerance):
+                regressions.append(
+                    name + ': peak bytes ' + str(cur['peak_bytes']) +
+                    ' > baseline ' + str(base['peak_bytes'])
+                )
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--numdocs', type=int, default=1000)
+    parser.add_argument('--nltk-corpus', default=None)
+    parser.add_argument('--flag-density', type=float, default=.05)
+    parser.add_argument('--number-density', type=float, default=.05)
+    parser.add_argument('--no-mem', action='store_true')
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=.1)
+    args = parser.parse_args(argv)
+
+    synth_args = {}
+    if args.nltk_corpus is None:
+        synth_args = {
+            'flag_density': args.flag_density,
+            'number_density': args.number_density,
+        }
+    res = run(
+        args.numdocs, args.nltk_corpus, not args.no_mem, **synth_args
+    )
+    for name, r in sorted(res['results'].items()):
+        if 'skipped' in r:
+            print(name + '\tskipped: ' + r['skipped'])
+            continue
+        print(
+            name + '\t' + '%.0f' % r['tkns_per_sec'] + ' tokens/sec' +
+            ('\t' + str(r['peak_bytes']) + ' peak bytes'
+             if 'peak_bytes' in r else '')
+        )
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            f.write(json.dumps(res, indent=2, sort_keys=True))
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(res, json.loads(f.read()), args.tolerance)
+        for r in regressions:
+            print('REGRESSION\t' + r)
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -6,8 +6,11 @@ import nltk
 from scipy import sparse
 from sklearn.preprocessing import normalize
 from sklearn.feature_selection import SelectKBest, chi2
-from collections import Counter
+from collections import Counter, deque
 from lib.saxutil import ftmap
+from lib.saxutil import instrument
+from lib.saxutil import mem_util
+from lib.saxutil import mtx_util
 from lib.saxutil.txt_proc import tkn_transform
 
 
@@ -22,26 +25,46 @@ def map_fts_to_cols(fts):
     return col_on_ft
 
 
-def mk_mtx(fmap, ft_cntrs, col_on_ft, row_norma=None):
+def mk_mtx(
+    fmap, ft_cntrs, col_on_ft, row_norma=None, dtype=np.float64,
+    idx_dtype=None
+):
     """
     :type fmap: FeatureMap
     :type ft_cntrs: list<Counter>
     :type col_on_ft: dict<int, int>
     :type row_norma: str
-    :rtype: scipy.sparse.lil_matrix
+    :type dtype: numpy.dtype
+    :param dtype: type of the matrix values. EG: numpy.float32, or
+        numpy.int32 for raw counts. Normalized rows cannot be integers, so
+        when "row_norma" is set an integer dtype gives a float32 matrix.
+    :type idx_dtype: numpy.dtype
+    :param idx_dtype: type of the column indices and row pointers. EG:
+        numpy.int32. By default scipy picks one.
+    :rtype: scipy.sparse.csr_matrix
     """
     numrows = len(ft_cntrs)
     numcols = len(col_on_ft)
-    mtx = sparse.lil_matrix((numrows, numcols,))
+    indptr = np.zeros(numrows + 1, dtype=np.int64)
+    cols, vals = [], []
     for row_ix in range(numrows):
         for ft, cnt in ft_cntrs[row_ix].items():
             col_ix = col_on_ft.get(ft)
-            if col_ix is None:
+            if col_ix is None or cnt == 0:
                 continue
-            mtx[row_ix, col_ix] = cnt
-    if row_norma is not None:
-        return normalize(mtx, norm=row_norma)
-    return mtx
+            cols.append(col_ix)
+            vals.append(cnt)
+        indptr[row_ix + 1] = len(cols)
+    mtx = mtx_util.csr_from_arrs(
+        np.array(vals, dtype=dtype), np.array(cols, dtype=np.int64), indptr,
+        (numrows, numcols,), idx_dtype
+    )
+    mtx.sort_indices()
+    if row_norma is None:
+        return mtx
+    if not np.issubdtype(dtype, np.floating):
+        mtx = mtx.astype(np.float32)
+    return normalize(mtx, norm=row_norma, copy=False)
 
 
 def add_cntr_doc(cntr, fmap, cur_cntrs, cur_lbls=None, new_lbl=None):
@@ -76,11 +99,27 @@ def get_fts(ft_cntrs):
     return fts
 
 
+# model attributes reported as "coefficients" by Clf.memory_report
+MDL_COEF_ATTRS = (
+    'coef_', 'intercept_', 'centroids_', 'feature_log_prob_',
+    'class_log_prior_',
+)
+
+
 class ClfBase(object):
-    def __init__(self):
+    def __init__(self, dtype=np.float64, idx_dtype=None):
+        """
+        :type dtype: numpy.dtype
+        :param dtype: value type of generated matrices. See mk_mtx.
+        :type idx_dtype: numpy.dtype
+        :param idx_dtype: index type of generated matrices. See mk_mtx.
+        """
         self.fmap = ftmap.FeatureMap()
         self.ft_cntrs = []
         self.col_on_ft = None
+        self.ft_bl = set()
+        self.dtype = dtype
+        self.idx_dtype = idx_dtype
 
     def clear(self):
         self.ft_cntrs = []
@@ -90,7 +129,8 @@ class ClfBase(object):
 
     def mk_mtx(self, row_norma='l2'):
         return mk_mtx(
-            self.fmap, self.ft_cntrs, self.col_on_ft, row_norma
+            self.fmap, self.ft_cntrs, self.col_on_ft, row_norma, self.dtype,
+            self.idx_dtype
         )
 
     def resultant_cntr(self):
@@ -99,15 +139,49 @@ class ClfBase(object):
             res += self.ft_cntrs[i]
         return res
 
+    def _mtx_col_on_ft(self):
+        if self.col_on_ft is not None:
+            return self.col_on_ft
+        return map_fts_to_cols(self.fmap.fts() - self.ft_bl)
+
+    def _memory_report(self, objs_on_name, trace):
+        col_on_ft = self._mtx_col_on_ft()
+        nnz = 0
+        for cntr in self.ft_cntrs:
+            for ft, cnt in cntr.items():
+                if cnt != 0 and ft in col_on_ft:
+                    nnz += 1
+        rep = mem_util.sizes_report(
+            [('documents', self.ft_cntrs)] + objs_on_name
+        )
+        rep['fmap'] = self.fmap.memory_report()
+        rep['total'] += rep['fmap']['total']
+        # not held, but what mk_mtx would allocate for the documents
+        rep['mtx'] = mem_util.csr_nbytes(
+            nnz, len(self.ft_cntrs), self.dtype,
+            np.int32 if self.idx_dtype is None else self.idx_dtype
+        )
+        if trace:
+            rep['peak'] = {'mk_mtx': mem_util.traced_peak(
+                mk_mtx, self.fmap, self.ft_cntrs, col_on_ft, 'l2', self.dtype,
+                self.idx_dtype
+            )[1]}
+        return rep
+
 
 class Clf(ClfBase):
-    def __init__(self, mdl, fmap, col_on_ft, row_norma='l2'):
+    def __init__(
+        self, mdl, fmap, col_on_ft, row_norma='l2', dtype=np.float64,
+        idx_dtype=None
+    ):
         """
         :param mdl: trained sklearn model
         :type fmap: FeatureMap
         :param fmap: feature map object that aligns words to matrix columns
+        :type dtype: numpy.dtype
+        :type idx_dtype: numpy.dtype
         """
-        super(Clf, self).__init__()
+        super(Clf, self).__init__(dtype, idx_dtype)
         self.mdl = mdl
         self.fmap = fmap
         self.ft_cntrs = []
@@ -117,19 +191,67 @@ class Clf(ClfBase):
     def num_fts(self):
         return len(self.col_on_ft)
 
+    def memory_report(self, trace=False):
+        """
+        Bytes held by the classifier, by part. "mtx" is the size of the
+        matrix mk_mtx would build for the documents currently added.
+
+        :type trace: bool
+        :param trace: also measure the peak memory of mk_mtx with
+            tracemalloc, under "peak"
+        :rtype: dict<str, obj>
+        """
+        rep = self._memory_report([('col_on_ft', self.col_on_ft)], trace)
+        rep['model'] = mem_util.sizes_report([
+            ('coefficients', [
+                getattr(self.mdl, a) for a in MDL_COEF_ATTRS
+                if hasattr(self.mdl, a)
+            ]),
+            ('other', self.mdl),
+        ])
+        rep['total'] += rep['model']['total']
+        return rep
+
     def add_cntr_doc(self, cntr):
         add_cntr_doc(cntr, self.fmap, self.ft_cntrs)
 
     def add_obj_list_doc(self, obj_list):
         self.add_cntr_doc(Counter(obj_list))
 
+    @instrument.timed('bowclf.Clf.predict')
     def predict(self, return_proba=False):
+        mtx = self.mk_mtx(row_norma=None)
+        return self.predict_mtx(mtx, return_proba)
+
+    def predict_mtx(self, mtx, return_proba=False, block_size=100000):
+        """
+        Predict the rows of an already built matrix, such as one opened with
+        mtx_store.load_mtx. Rows are normalized with "row_norma" and
+        predicted "block_size" rows at a time.
+
+        :type mtx: sparse scipy matrix
+        :param mtx: columns must follow "col_on_ft"
+        :type return_proba: bool
+        :type block_size: int
+        """
+        if mtx.shape[1] != self.num_fts():
+            raise ValueError('mtx.shape[1] != number of features')
+        preds = []
+        for block in mtx_util.iter_row_blocks(mtx, block_size):
+            if self.row_norma is not None:
+                block = normalize(block, norm=self.row_norma)
+            if not return_proba:
+                preds.extend(self.mdl.predict(block))
+            else:
+                preds.extend(self._predict_proba_block(block))
         if not return_proba:
-            return self.mdl.predict(self.mk_mtx(self.row_norma))
+            return np.array(preds)
+        return preds
 
-        pred_prob_mtx = [ [None, None] for i in range(self.num_docs()) ]
+    def _predict_proba_block(self, mtx):
+        pred_prob_mtx = [ [None, None] for i in range(mtx.shape[0]) ]
         #pred_prob_mtx = np.zeros((self.num_docs(), 2,))
-        prob_arrs = self.mdl.predict_proba(self.mk_mtx(self.row_norma))
+        prob_arrs = self.mdl.predict_proba(mtx)
         for i in range(len(prob_arrs)):
             max_prob = max(prob_arrs[i])
             pred = self.mdl.classes_[list(prob_arrs[i]).index(max_prob)]
@@ -149,7 +271,14 @@ def serialize_clf_to_dir(clf, dirpath):
     with open(os.path.join(dirpath, 'mdl.pkl'), 'wb') as f:
         f.write(pickle.dumps(clf.mdl))
     with open(os.path.join(dirpath, 'meta.json'), 'w') as f:
-        f.write(json.dumps({'row_norma': clf.row_norma}))
+        f.write(json.dumps({
+            'row_norma': clf.row_norma,
+            'dtype': np.dtype(clf.dtype).str,
+            'idx_dtype': (
+                None if clf.idx_dtype is None else
+                np.dtype(clf.idx_dtype).str
+            ),
+        }))
 
 
 def load_clf_from_dir(dirpath):
@@ -164,14 +293,23 @@ def load_clf_from_dir(dirpath):
         mdl = pickle.loads(f.read())
     with open(os.path.join(dirpath, 'meta.json')) as f:
         meta = json.loads(f.read())
-    return Clf(mdl, fmap, col_on_ft, meta['row_norma'])
+    dtype = np.dtype(meta.get('dtype', np.dtype(np.float64).str))
+    idx_dtype = meta.get('idx_dtype')
+    if idx_dtype is not None:
+        idx_dtype = np.dtype(idx_dtype)
+    return Clf(mdl, fmap, col_on_ft, meta['row_norma'], dtype, idx_dtype)
 
 
 class Trnr(ClfBase):
-    def __init__(self):
-        super(Trnr, self).__init__()
+    def __init__(self, dtype=np.float64, idx_dtype=None):
+        """
+        :type dtype: numpy.dtype
+        :param dtype: value type of generated matrices. EG: numpy.float32
+            roughly halves matrix memory compared to the float64 default.
+        :type idx_dtype: numpy.dtype
+        """
+        super(Trnr, self).__init__(dtype, idx_dtype)
         self.lbls = []
-        self.ft_bl = set()
 
     def num_fts(self):
         """
@@ -181,6 +319,30 @@ class Trnr(ClfBase):
         """
         return self.fmap.num_fts() - len(self.ft_bl)
 
+    def memory_report(self, trace=False, mdl=None):
+        """
+        Bytes held by the trainer, by part. "mtx" is the size of the
+        matrix mk_mtx would build.
+
+        :type trace: bool
+        :param trace: also measure the peak memory of mk_mtx with
+            tracemalloc, under "peak"
+        :type mdl: sklearn.base.BaseEstimator
+        :param mdl: when tracing, an untrained model to measure to_clf with.
+            It is fitted. map_fts_to_cols must have been called.
+        :rtype: dict<str, obj>
+        """
+        rep = self._memory_report([
+            ('labels', self.lbls),
+            ('ft_bl', self.ft_bl),
+            ('col_on_ft', self.col_on_ft),
+        ], trace)
+        if trace and mdl is not None:
+            if self.col_on_ft is None:
+                raise ValueError('map_fts_to_cols must be called first')
+            rep['peak']['to_clf'] = mem_util.traced_peak(self.to_clf, mdl)[1]
+        return rep
+
     def add_cntr_doc(self, cntr, lbl):
         """
         :type cntr: Counter
@@ -204,6 +366,7 @@ class Trnr(ClfBase):
         for ft in fts:
             self.ft_bl.add(ft)
 
+    @instrument.timed('bowclf.Trnr.rm_fts')
     def rm_fts(self, rmfts):
         """
         :type rmfts: set<int>
@@ -234,6 +397,7 @@ class Trnr(ClfBase):
         self.ft_bl = new_ft_bl
         self.fmap = new_fmap
 
+    @instrument.timed('bowclf.Trnr.score_fts')
     def score_fts(self, scorer=chi2, row_norma='l2'):
         self.map_fts_to_cols()
         ft_on_col = {f: c for c, f in self.col_on_ft.items()}
@@ -280,6 +444,7 @@ class Trnr(ClfBase):
         ft_wl = self.fmap.fts() - self.ft_bl
         self.col_on_ft = map_fts_to_cols(ft_wl)
 
+    @instrument.timed('bowclf.Trnr.to_clf')
     def to_clf(self, mdl, row_norma='l2'):
         """
         :type mdl: sklearn.base.BaseEstimator
@@ -287,9 +452,30 @@ class Trnr(ClfBase):
             EG: LogisticRegression(C=5)
         """
         mdl.fit(self.mk_mtx(row_norma), self.lbls)
-        return Clf(mdl, self.fmap, self.col_on_ft, 'l2')
+        return Clf(
+            mdl, self.fmap, self.col_on_ft, row_norma, self.dtype,
+            self.idx_dtype
+        )
+
+    def refresh_centroid(self, clf, lbl):
+        """
+        Recompute the centroid of one label in a Clf built from a
+        centroid.CentroidMdl, using the documents currently in this Trnr. The
+        rest of the model is not retrained, and only the documents labelled
+        "lbl" are turned into a matrix.
+
+        :type clf: Clf
+        :type lbl: obj
+        """
+        rows = [i for i in range(len(self.lbls)) if self.lbls[i] == lbl]
+        mtx = mk_mtx(
+            self.fmap, [self.ft_cntrs[i] for i in rows], clf.col_on_ft,
+            clf.row_norma, clf.dtype, clf.idx_dtype
+        )
+        clf.mdl.refit_lbl(mtx, [lbl] * len(rows), lbl)
 
 
+@instrument.timed('bowclf.add_trn_docs')
 def add_trn_docs(docs, lbls, pipe, tokenize_method, trnr=None):
     if trnr is None:
         trnr = Trnr()
@@ -302,6 +488,43 @@ def add_trn_docs(docs, lbls, pipe, tokenize_method, trnr=None):
     return trnr
 
 
+def add_trn_doc_stream(
+    doc_lbls, pipe, tokenize_method=None, trnr=None,
+    iter_method=tkn_transform.iter_pipeline
+):
+    """
+    Like add_trn_docs, but reads (document, label) pairs from an iterator
+    one at a time, so only the current document's tokens are in memory.
+    The Trnr still keeps one feature Counter per document.
+
+    :type doc_lbls: iterable<tuple(obj, obj,)>
+    :param doc_lbls: documents as taken by tkn_transform.iter_pipeline,
+        paired with their labels
+    :type pipe: list<obj>
+    :type tokenize_method: function
+    :type trnr: Trnr
+    :type iter_method: function
+    :param iter_method: runs the pipeline over the documents and yields the
+        results in input order, such as par_pipeline.iter_pipeline_par. It
+        may read any number of documents ahead.
+    :rtype: Trnr
+    """
+    if trnr is None:
+        trnr = Trnr()
+    # labels wait here, in input order, until their document's result is
+    # yielded
+    lbls = deque()
+
+    def docs():
+        for doc, lbl in doc_lbls:
+            lbls.append(lbl)
+            yield doc
+
+    for tkns, tags in iter_method(pipe, docs(), tokenize_method):
+        trnr.add_obj_list_doc(tkns, lbls.popleft())
+    return trnr
+
+
 def mk_bow_trnr(pipe, tkn_lil, tag_lil, lbls):
     if len(tkn_lil) != len(tag_lil) != len(lbls):
         raise ValueError('len(tkn_lil) != len(tag_lil) != len(lbls)')
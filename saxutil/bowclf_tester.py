@@ -1,15 +1,30 @@
 import nltk
 from lib.saxutil import bowclf
 from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.txt_proc import corpus_cache
 
 class TrnrHighLvl(object):
-    def __init__(self, pipe, trndocs, trnlbls):
+    def __init__(self, pipe, trndocs, trnlbls, cache_dir=None):
+        """
+        :type pipe: list<obj>
+        :type trndocs: list<str>
+        :type trnlbls: list<obj>
+        :type cache_dir: str
+        :param cache_dir: if set, transformed documents are cached there by
+            corpus_cache.CorpusCache and later runs with the same documents
+            and pipeline skip tokenizing and transforming them
+        """
         if len(trndocs) != len(trnlbls):
             raise ValueError('len(trndocs) != len(trnlbls)')
-        self.trn_tkn_docs = [nltk.word_tokenize(d) for d in trndocs]
-        self.trn_tkn_docs = (
-            [tkn_transform.run_pipeline(pipe, self.trn_tkn_docs)]
-        )
+        if cache_dir is not None:
+            self.trn_tkn_docs = corpus_cache.CorpusCache(
+                cache_dir, pipe, nltk.word_tokenize
+            ).run(trndocs)
+        else:
+            self.trn_tkn_docs = [
+                tkn_transform.run_pipeline(pipe, nltk.word_tokenize(d))[0]
+                for d in trndocs
+            ]
         self.trnlbls = trnlbls
 
     def mk_clf(self, unfitmdl, minfreq=1, scorepct=0):
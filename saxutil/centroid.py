@@ -0,0 +1,121 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from lib.saxutil import mtx_util
+
+
+class CentroidMdl(object):
+    """
+    Nearest centroid (Rocchio) model. Each label is represented by the
+    normalized resultant of its training rows and a document is assigned the
+    label whose centroid has the highest cosine similarity.
+
+    The interface mirrors the parts of a scikit-learn estimator that Trnr and
+    Clf use (fit, predict, predict_proba and classes_), so an instance can be
+    passed to Trnr.to_clf and serialized with serialize_clf_to_dir.
+
+    EXAMPLE
+    -------
+    clf = trnr.to_clf(CentroidMdl())
+    # after adding more documents labelled "sports" to trnr
+    trnr.refresh_centroid(clf, 'sports')
+    -------
+    """
+    def __init__(self, norma='l2'):
+        """
+        :type norma: str
+        :param norma: norm used to normalize each centroid
+        """
+        self.norma = norma
+        self.classes_ = None
+        self.centroids_ = None
+
+    def fit(self, mtx, lbls):
+        """
+        :type mtx: sparse scipy matrix
+        :type lbls: list<obj>
+        :rtype: CentroidMdl
+        """
+        if mtx.shape[0] != len(lbls):
+            raise IndexError('mtx.shape[0] != len(lbls)')
+        self.classes_, lbl_ixs = np.unique(
+            np.asarray(lbls), return_inverse=True
+        )
+        res_mtx = mtx_util.grouped_resultants(
+            sparse.csr_matrix(mtx), lbl_ixs, len(self.classes_)
+        )
+        self.centroids_ = normalize(res_mtx, norm=self.norma)
+        return self
+
+    def refit_lbl(self, mtx, lbls, lbl):
+        """
+        Recompute the centroid of a single label from the rows of "mtx"
+        labelled "lbl". All other centroids are left untouched. If "lbl" is
+        new to the model it is added.
+
+        :type mtx: sparse scipy matrix
+        :param mtx: matrix with the same columns the model was fit on
+        :type lbls: list<obj>
+        :type lbl: obj
+        """
+        if self.centroids_ is None:
+            raise ValueError('model has not been fit')
+        if mtx.shape[1] != self.centroids_.shape[1]:
+            raise ValueError('mtx.shape[1] != number of model columns')
+        rows = [i for i in range(len(lbls)) if lbls[i] == lbl]
+        if len(rows) == 0:
+            raise ValueError('no rows labelled: ' + str(lbl))
+        res = mtx_util.resultant(sparse.csr_matrix(mtx)[rows])
+        cent = normalize(sparse.csr_matrix(res), norm=self.norma)
+
+        ix = int(np.searchsorted(self.classes_, lbl))
+        if ix < len(self.classes_) and self.classes_[ix] == lbl:
+            self.centroids_ = sparse.vstack(
+                [self.centroids_[:ix], cent, self.centroids_[ix + 1:]],
+                format='csr'
+            )
+            return
+        # np.insert would keep the old dtype and truncate a longer string
+        new = np.asarray([lbl])
+        dtype = np.result_type(self.classes_, new)
+        self.classes_ = np.concatenate([
+            self.classes_[:ix].astype(dtype), new.astype(dtype),
+            self.classes_[ix:].astype(dtype)
+        ])
+        self.centroids_ = sparse.vstack(
+            [self.centroids_[:ix], cent, self.centroids_[ix:]], format='csr'
+        )
+
+    def decision_function(self, mtx):
+        """
+        Cosine similarity of every row in "mtx" to every centroid.
+
+        :type mtx: sparse scipy matrix
+        :rtype: numpy.ndarray
+        :returns: array of shape (num rows, num classes)
+        """
+        mtx = normalize(sparse.csr_matrix(mtx), norm='l2')
+        return np.asarray(mtx.dot(self.centroids_.T).todense())
+
+    def predict(self, mtx):
+        """
+        :type mtx: sparse scipy matrix
+        :rtype: numpy.ndarray
+        """
+        return self.classes_[self.decision_function(mtx).argmax(axis=1)]
+
+    def predict_proba(self, mtx):
+        """
+        Similarities rescaled so each row sums to one. These are not
+        calibrated probabilities, but their argmax matches predict. Rows with
+        no similarity to any centroid are given a uniform distribution.
+
+        :type mtx: sparse scipy matrix
+        :rtype: numpy.ndarray
+        """
+        sims = np.clip(self.decision_function(mtx), 0.0, None)
+        totals = sims.sum(axis=1)
+        empty = totals == 0.0
+        sims[empty] = 1.0
+        totals[empty] = sims.shape[1]
+        return sims / totals[:, np.newaxis]
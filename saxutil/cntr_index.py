@@ -0,0 +1,182 @@
+import heapq
+import math
+import pickle
+import multiprocessing
+
+
+def cntr_norm(cntr):
+    """
+    :type cntr: Counter
+    :rtype: float
+    """
+    return math.sqrt(sum([float(v) * v for v in cntr.values()]))
+
+
+class CntrSimIndex(object):
+    """
+    Inverted index over a library of reference Counters that answers top-k
+    cosine similarity queries without scanning every reference.
+
+    Each object keeps a postings dict of {doc id: normalized weight}. A query
+    walks its terms from the highest weight down. Once the best score any
+    unseen document could still reach falls below the current k-th best
+    score, no new candidates are admitted and the remaining terms only update
+    documents that are already candidates. This assumes counts are not
+    negative, which holds for term counts.
+
+    EXAMPLE
+    -------
+    idx = CntrSimIndex()
+    ids = idx.add_all(ref_cntrs)
+    idx.query(Counter(['dog', 'pony']), k=5)
+    # -> [(doc id, cosine similarity), ...] best first
+    -------
+    """
+    def __init__(self):
+        self.postings = {}
+        self.max_wgt_on_obj = {}
+        self.objs_on_doc = {}
+        self.norm_on_doc = {}
+        self._next_id = 0
+
+    def num_docs(self):
+        return len(self.objs_on_doc)
+
+    def add(self, cntr):
+        """
+        :type cntr: Counter
+        :rtype: int
+        :returns: id of the new document
+        """
+        doc_id = self._next_id
+        self._next_id += 1
+        norm = cntr_norm(cntr)
+        self.norm_on_doc[doc_id] = norm
+        self.objs_on_doc[doc_id] = [o for o, v in cntr.items() if v != 0]
+        for obj in self.objs_on_doc[doc_id]:
+            wgt = cntr[obj] / norm
+            posting = self.postings.setdefault(obj, {})
+            posting[doc_id] = wgt
+            if wgt > self.max_wgt_on_obj.get(obj, 0.0):
+                self.max_wgt_on_obj[obj] = wgt
+        return doc_id
+
+    def add_all(self, cntrs):
+        """
+        :type cntrs: list<Counter>
+        :rtype: list<int>
+        """
+        return [self.add(c) for c in cntrs]
+
+    def remove(self, doc_id):
+        """
+        :type doc_id: int
+        """
+        if doc_id not in self.objs_on_doc:
+            raise KeyError('doc_id not in index: ' + str(doc_id))
+        for obj in self.objs_on_doc.pop(doc_id):
+            posting = self.postings[obj]
+            wgt = posting.pop(doc_id)
+            if len(posting) == 0:
+                del self.postings[obj]
+                del self.max_wgt_on_obj[obj]
+            elif wgt >= self.max_wgt_on_obj[obj]:
+                self.max_wgt_on_obj[obj] = max(posting.values())
+        del self.norm_on_doc[doc_id]
+
+    def query(self, cntr, k=10):
+        """
+        :type cntr: Counter
+        :type k: int
+        :rtype: list<tuple(int, float,)>
+        :returns: up to k (doc id, cosine similarity) pairs, best first.
+            Documents sharing no objects with the query are not returned.
+        """
+        norm = cntr_norm(cntr)
+        if norm == 0.0 or k <= 0:
+            return []
+        terms = []
+        for obj, v in cntr.items():
+            if obj in self.postings and v != 0:
+                terms.append((v / norm, obj,))
+        terms.sort(key=lambda t: -t[0] * self.max_wgt_on_obj[t[1]])
+
+        # Upper bound on the score still available from terms[i:]
+        remaining = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            qwgt, obj = terms[i]
+            remaining[i] = (
+                remaining[i + 1] + abs(qwgt) * self.max_wgt_on_obj[obj]
+            )
+
+        scores = {}
+        admitting = True
+        for i in range(len(terms)):
+            qwgt, obj = terms[i]
+            posting = self.postings[obj]
+            if admitting:
+                for doc_id, wgt in posting.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + qwgt * wgt
+                if len(scores) >= k:
+                    kth = heapq.nlargest(k, scores.values())[-1]
+                    admitting = remaining[i + 1] > kth
+                continue
+            if len(posting) < len(scores):
+                for doc_id, wgt in posting.items():
+                    if doc_id in scores:
+                        scores[doc_id] += qwgt * wgt
+            else:
+                for doc_id in scores:
+                    wgt = posting.get(doc_id)
+                    if wgt is not None:
+                        scores[doc_id] += qwgt * wgt
+        return heapq.nlargest(k, scores.items(), key=lambda t: t[1])
+
+    def query_batch(self, cntrs, k=10, numprocs=1):
+        """
+        Run "query" over every counter in "cntrs". When "numprocs" is greater
+        than one the index is sent to each worker process once and the
+        queries are spread across the workers.
+
+        :type cntrs: list<Counter>
+        :type k: int
+        :type numprocs: int
+        :rtype: list<list<tuple(int, float,)>>
+        """
+        if numprocs <= 1:
+            return [self.query(c, k) for c in cntrs]
+        with multiprocessing.Pool(
+            numprocs, initializer=_init_worker, initargs=(self,)
+        ) as pool:
+            chunksize = max(1, len(cntrs) // (numprocs * 4))
+            return pool.starmap(
+                _worker_query, [(c, k,) for c in cntrs], chunksize
+            )
+
+
+_worker_idx = None
+
+
+def _init_worker(idx):
+    global _worker_idx
+    _worker_idx = idx
+
+
+def _worker_query(cntr, k):
+    return _worker_idx.query(cntr, k)
+
+
+def dumps(idx):
+    """
+    :type idx: CntrSimIndex
+    :rtype: bytes
+    """
+    return pickle.dumps(idx)
+
+
+def loads(dta):
+    """
+    :type dta: bytes
+    :rtype: CntrSimIndex
+    """
+    return pickle.loads(dta)
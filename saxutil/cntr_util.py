@@ -1,41 +1,114 @@
-from scipy.sparse import lil_matrix
-from scipy.spatial import distance
+import numpy as np
+from collections import Counter
+from scipy.sparse.linalg import norm as sparse_norm
+from lib.saxutil import mtx_util
 
 
 def convert_values_to_float(cntr):
-    for k, v in cntr.items():
-        cntr[k] = float(v)
+    """
+    :type cntr: Counter
+    :rtype: Counter
+    :returns: a copy of "cntr" with float values. "cntr" is not modified.
+    """
+    return Counter({k: float(v) for k, v in cntr.items()})
+
+
+def mtx_from_cntrs(cntrs, dtype=np.float64, idx_dtype=None):
+    """
+    :type cntrs: list<Counter>
+    :type dtype: numpy.dtype
+    :param dtype: values are cast to this type as they are copied. The
+        counters themselves are not modified.
+    :type idx_dtype: numpy.dtype
+    :param idx_dtype: type of the column indices and row pointers. EG:
+        numpy.int32
+    :rtype: tuple(scipy.sparse.csr_matrix, dict<obj, int>)
+    """
+    mtx, col_on_obj = csr_from_cntrs(cntrs, dtype=dtype, idx_dtype=idx_dtype)
+    mtx.eliminate_zeros()
+    return mtx, col_on_obj
 
-def mtx_from_cntrs(cntrs):
-    # Convert all the values in the counters to floats
-    for i in range(len(cntrs)):
-        convert_values_to_float(cntrs[i])
 
-    # Map objects to matrix columns
-    col_on_obj = {}
-    cur_ix = 0
+def map_objs_to_cols(cntrs, col_on_obj=None):
+    """
+    Extend "col_on_obj" (or a new dict) with a column for every object in
+    "cntrs" that is not already mapped.
+
+    :type cntrs: list<Counter>
+    :type col_on_obj: dict<obj, int>
+    :rtype: dict<obj, int>
+    """
+    col_on_obj = {} if col_on_obj is None else col_on_obj
     for c in cntrs:
-        for obj in c.keys():
-            col = col_on_obj.get(obj)
-            if col is None:
-                col_on_obj[obj] = cur_ix
-                cur_ix += 1
-    numrows = len(cntrs)
-    numcols = len(col_on_obj)
-    mtx = lil_matrix((numrows, numcols))
-
-    for rownum in range(numrows):
-        for obj in cntrs[rownum].keys():
-            colnum = col_on_obj[obj]
-            mtx[rownum, colnum] = cntrs[rownum][obj]
+        for obj in c:
+            if obj not in col_on_obj:
+                col_on_obj[obj] = len(col_on_obj)
+    return col_on_obj
+
+
+def csr_from_cntrs(cntrs, col_on_obj=None, dtype=np.float64, idx_dtype=None):
+    """
+    Build a CSR matrix from "cntrs" in one pass over the counters. The
+    counters are not modified.
+
+    :type cntrs: list<Counter>
+    :type col_on_obj: dict<obj, int>
+    :param col_on_obj: existing column mapping. Objects missing from it are
+        added.
+    :type dtype: numpy.dtype
+    :param dtype: type of the matrix values. EG: numpy.float32 or numpy.int32
+    :type idx_dtype: numpy.dtype
+    :param idx_dtype: type of the column indices and row pointers. EG:
+        numpy.int32. By default scipy picks one.
+    :rtype: tuple(scipy.sparse.csr_matrix, dict<obj, int>)
+    """
+    col_on_obj = map_objs_to_cols(cntrs, col_on_obj)
+    work_dtype = np.int64 if idx_dtype is None else idx_dtype
+    indptr = np.zeros(len(cntrs) + 1, dtype=work_dtype)
+    for i in range(len(cntrs)):
+        indptr[i + 1] = indptr[i] + len(cntrs[i])
+    indices = np.empty(indptr[-1], dtype=work_dtype)
+    data = np.empty(indptr[-1], dtype=dtype)
+    for i in range(len(cntrs)):
+        indices[indptr[i]:indptr[i + 1]] = [col_on_obj[o] for o in cntrs[i]]
+        data[indptr[i]:indptr[i + 1]] = list(cntrs[i].values())
+    mtx = mtx_util.csr_from_arrs(
+        data, indices, indptr, (len(cntrs), len(col_on_obj),), idx_dtype
+    )
     return mtx, col_on_obj
 
 
-def dists_from_ref_cntr(ref_cntr, comp_cntrs):
-    mtx, col_on_obj = mtx_from_cntrs([ref_cntr] + comp_cntrs)
-    refvec = mtx.getrow(0).todense()
-    dists = []
-    for i in range(1, mtx.shape[0]):
-        curvec = mtx.getrow(i).todense()
-        dists.append(distance.cosine(refvec, curvec))
+def cosine_dists(ref_cntrs, comp_cntrs, chunk_size=10000):
+    """
+    Cosine distance between every reference counter and every comparison
+    counter. The comparison counters are processed "chunk_size" at a time,
+    so only one chunk of the comparison matrix exists in memory at once.
+    As with scipy.spatial.distance.cosine, an empty counter gives a nan
+    distance.
+
+    :type ref_cntrs: list<Counter>
+    :type comp_cntrs: list<Counter>
+    :type chunk_size: int
+    :rtype: numpy.ndarray
+    :returns: array of shape (len(ref_cntrs), len(comp_cntrs))
+    """
+    ref_mtx, col_on_obj = csr_from_cntrs(ref_cntrs)
+    ref_norms = sparse_norm(ref_mtx, axis=1)
+    dists = np.empty((len(ref_cntrs), len(comp_cntrs)))
+    for beg in range(0, len(comp_cntrs), chunk_size):
+        chunk = comp_cntrs[beg:beg + chunk_size]
+        # Objects only found in the comparison counters cannot contribute to
+        # a dot product with the references, but they do count toward the
+        # norms, so they are mapped to columns beyond the reference columns.
+        comp_mtx, _ = csr_from_cntrs(chunk, dict(col_on_obj))
+        comp_norms = sparse_norm(comp_mtx, axis=1)
+        dots = comp_mtx[:, :ref_mtx.shape[1]].dot(ref_mtx.T).T.toarray()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dists[:, beg:beg + len(chunk)] = 1.0 - dots / np.outer(
+                ref_norms, comp_norms
+            )
     return dists
+
+
+def dists_from_ref_cntr(ref_cntr, comp_cntrs):
+    return list(cosine_dists([ref_cntr], comp_cntrs)[0])
@@ -1,4 +1,5 @@
 import json
+from lib.saxutil import mem_util
 
 
 def is_compressable(obj):
@@ -102,6 +103,18 @@ class FeatureMap(object):
     def num_fts(self):
         return self._cur_ix + 1
 
+    def memory_report(self):
+        """
+        :rtype: dict<str, int>
+        :returns: bytes held by the vocabulary (feature -> object) and the
+            reverse index (object -> feature). Objects held by both are
+            counted under the vocabulary.
+        """
+        return mem_util.sizes_report([
+            ('vocabulary', self._obj_on_ft),
+            ('reverse_index', self._ft_on_obj),
+        ])
+
 
 def rm_objs_remap(fmap, rmfts):
     # remove compressed features first
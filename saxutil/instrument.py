@@ -0,0 +1,213 @@
+"""
+Opt-in timing and token accounting for pipeline stages and training steps.
+Nothing is recorded until "enable" is called. While disabled, an
+instrumented function costs one extra call and a flag check.
+
+EXAMPLE
+-------
+instrument.enable(profile_stage='bowclf.Trnr.to_clf')
+trnr = bowclf.add_trn_docs(docs, lbls, pipe, nltk.word_tokenize)
+clf = trnr.to_clf(LogisticRegression())
+instrument.to_json()
+instrument.to_prometheus()
+print(instrument.profile_stats())
+-------
+"""
+import io
+import json
+import time
+import cProfile
+import pstats
+import functools
+
+_enabled = False
+_profile_stage = None
+_profiler = None
+_stats_on_stage = {}
+
+
+class StageStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.secs = 0.0
+        self.tkns_in = 0
+        self.tkns_out = 0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'secs': self.secs,
+            'tkns_in': self.tkns_in,
+            'tkns_out': self.tkns_out,
+            'tkns_dropped': self.tkns_in - self.tkns_out,
+        }
+
+
+def enable(profile_stage=None):
+    """
+    :type profile_stage: str
+    :param profile_stage: name of one stage to run under cProfile, such as
+        'run_pipeline.StemReplacer' or 'bowclf.Trnr.rm_fts'
+    """
+    global _enabled, _profile_stage, _profiler
+    _enabled = True
+    _profile_stage = profile_stage
+    _profiler = None if profile_stage is None else cProfile.Profile()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """
+    :rtype: bool
+    """
+    return _enabled
+
+
+def reset():
+    """
+    Drop everything recorded so far, including the profile.
+    """
+    global _stats_on_stage, _profiler
+    _stats_on_stage = {}
+    if _profile_stage is not None:
+        _profiler = cProfile.Profile()
+
+
+def record(stage, secs, tkns_in=0, tkns_out=0):
+    """
+    :type stage: str
+    :type secs: float
+    :type tkns_in: int
+    :type tkns_out: int
+    """
+    st = _stats_on_stage.get(stage)
+    if st is None:
+        st = _stats_on_stage[stage] = StageStats()
+    st.calls += 1
+    st.secs += secs
+    st.tkns_in += tkns_in
+    st.tkns_out += tkns_out
+
+
+def call(stage, func, *args, **kwargs):
+    """
+    Run "func", timing it as "stage", and under cProfile if it is the
+    profiled stage.
+
+    :type stage: str
+    :type func: function
+    """
+    beg = time.perf_counter()
+    if stage == _profile_stage and _profiler is not None:
+        res = _profiler.runcall(func, *args, **kwargs)
+    else:
+        res = func(*args, **kwargs)
+    record(stage, time.perf_counter() - beg)
+    return res
+
+
+def run_stage(stage, run, tkns, tags):
+    """
+    Like "call" for a transformer's run method, also counting the tokens
+    that go in and come out.
+
+    :type stage: str
+    :type run: function
+    :type tkns: list<str>
+    :type tags: list<str>
+    """
+    beg = time.perf_counter()
+    if stage == _profile_stage and _profiler is not None:
+        _tkns, _tags = _profiler.runcall(run, tkns, tags)
+    else:
+        _tkns, _tags = run(tkns, tags)
+    record(stage, time.perf_counter() - beg, len(tkns), len(_tkns))
+    return _tkns, _tags
+
+
+def timed(stage):
+    """
+    Decorator recording each call of the function as "stage" while
+    instrumentation is enabled.
+
+    :type stage: str
+    """
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            return call(stage, func, *args, **kwargs)
+        return wrapper
+    return deco
+
+
+def to_dict():
+    """
+    :rtype: dict<str, dict<str, obj>>
+    """
+    return {
+        stage: st.to_dict() for stage, st in sorted(_stats_on_stage.items())
+    }
+
+
+def to_json():
+    """
+    :rtype: str
+    """
+    return json.dumps(to_dict(), sort_keys=True)
+
+
+def _escape_lbl(val):
+    return val.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(prefix='saxutil'):
+    """
+    The stats in the Prometheus text exposition format, one counter per
+    stat with the stage as the "stage" label.
+
+    :type prefix: str
+    :rtype: str
+    """
+    stats = to_dict()
+    lines = []
+    for key, name, desc in (
+        ('calls', 'stage_calls_total', 'Number of calls'),
+        ('secs', 'stage_seconds_total', 'Wall time in seconds'),
+        ('tkns_in', 'stage_tokens_in_total', 'Tokens passed in'),
+        ('tkns_out', 'stage_tokens_out_total', 'Tokens passed out'),
+        ('tkns_dropped', 'stage_tokens_dropped_total', 'Tokens dropped'),
+    ):
+        metric = prefix + '_' + name
+        lines.append('# HELP ' + metric + ' ' + desc)
+        lines.append('# TYPE ' + metric + ' counter')
+        for stage, st in stats.items():
+            lines.append(
+                metric + '{stage="' + _escape_lbl(stage) + '"} ' +
+                repr(st[key])
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def profile_stats(sort='cumulative', n=30):
+    """
+    :type sort: str
+    :type n: int
+    :rtype: str
+    :returns: pstats report of the profiled stage, or None if no stage is
+        profiled or it has not run
+    """
+    if _profiler is None:
+        return None
+    out = io.StringIO()
+    try:
+        pstats.Stats(_profiler, stream=out).sort_stats(sort).print_stats(n)
+    except TypeError:
+        # nothing has been profiled yet
+        return None
+    return out.getvalue()
@@ -0,0 +1,110 @@
+import sys
+import types
+import tracemalloc
+import numpy as np
+
+_SKIP_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType,
+)
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Bytes held by an object and everything it refers to: container items,
+    instance attributes, numpy buffers and so sparse matrix arrays. Classes,
+    modules and functions are not followed.
+
+    :type obj: obj
+    :type seen: set<int>
+    :param seen: ids of objects already counted. Pass the same set to
+        several calls so that shared objects are only counted once.
+    :rtype: int
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while len(stack) > 0:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP_TYPES):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, np.ndarray):
+            # views only count their header. The buffer is counted with the
+            # array that owns it.
+            if o.base is not None:
+                stack.append(o.base)
+            if o.dtype == object:
+                stack.extend(o.ravel().tolist())
+            continue
+        if isinstance(o, (str, bytes, int, float, bool, complex,)):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset,)):
+            stack.extend(o)
+        if hasattr(o, '__dict__'):
+            stack.append(o.__dict__)
+        for name in getattr(type(o), '__slots__', ()):
+            if hasattr(o, name):
+                stack.append(getattr(o, name))
+    return total
+
+
+def sizes_report(objs_on_name):
+    """
+    :type objs_on_name: list<tuple(str, obj,)>
+    :param objs_on_name: (name, object) pairs. Objects reachable from an
+        earlier pair are not counted again under a later one.
+    :rtype: dict<str, int>
+    :returns: bytes on name, plus the sum as "total"
+    """
+    seen = set()
+    rep = {}
+    for name, obj in objs_on_name:
+        rep[name] = deep_sizeof(obj, seen)
+    rep['total'] = sum(rep.values())
+    return rep
+
+
+def traced_peak(func, *args, **kwargs):
+    """
+    Run "func" under tracemalloc. If tracemalloc is already tracing, its peak
+    is left as it was rather than reset, so the result is then an upper
+    bound: exact when "func" raised the peak, otherwise the distance from
+    the bytes traced before the call to the earlier peak.
+
+    :type func: function
+    :rtype: tuple(obj, int,)
+    :returns: the result and the peak bytes allocated while it ran
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    beg = tracemalloc.get_traced_memory()[0]
+    try:
+        res = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] - beg
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return res, peak
+
+
+def csr_nbytes(nnz, numrows, dtype, idx_dtype):
+    """
+    :type nnz: int
+    :type numrows: int
+    :type dtype: numpy.dtype
+    :type idx_dtype: numpy.dtype
+    :rtype: int
+    :returns: bytes of the data, indices and indptr arrays of a CSR matrix
+    """
+    idx_size = np.dtype(idx_dtype).itemsize
+    return (
+        nnz * (np.dtype(dtype).itemsize + idx_size) +
+        (numrows + 1) * idx_size
+    )
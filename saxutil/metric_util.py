@@ -1,4 +1,9 @@
+import multiprocessing
 import numpy as np
+from scipy import sparse
+
+# bound on the sampled cell counts held at once by a bootstrap worker
+BOOTSTRAP_CHUNK_CELLS = 2 ** 22
 
 
 def mk_lbl_metric_dict(tgts, preds, metrics):
@@ -39,3 +44,298 @@ def find_problem_cats_from_metric_dict(metric_dict, power=.5):
     tups.sort(key=lambda t: t[-1])
     tups.reverse()
     return tups
+
+
+def metrics_from_confusion(cmtx):
+    """
+    Per-label precision, recall, f1 and support from a confusion matrix in
+    one vectorized step. Rows are targets and columns are predictions. As
+    with scikit-learn, a metric whose denominator is zero is set to 0.
+
+    :type cmtx: numpy.ndarray
+    :param cmtx: array of shape (..., num labels, num labels). Leading
+        dimensions, such as bootstrap replicates, are kept.
+    :rtype: dict<str, numpy.ndarray>
+    """
+    cmtx = np.asarray(cmtx, dtype=np.float64)
+    return _metrics_from_totals(
+        np.diagonal(cmtx, axis1=-2, axis2=-1), cmtx.sum(axis=-1),
+        cmtx.sum(axis=-2)
+    )
+
+
+def _metrics_from_totals(tp, support, pred_tot):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(pred_tot > 0, tp / pred_tot, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        denom = support + pred_tot
+        f1 = np.where(denom > 0, 2.0 * tp / denom, 0.0)
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'support': support,
+    }
+
+
+def _sorted_lbl_ixs(lbls):
+    ixs = range(len(lbls))
+    try:
+        return sorted(ixs, key=lambda i: lbls[i])
+    except TypeError:
+        pass
+    # labels of different types, such as ints, strings and None, are
+    # grouped by type
+    try:
+        return sorted(ixs, key=lambda i: (type(lbls[i]).__name__, lbls[i],))
+    except TypeError:
+        return sorted(
+            ixs, key=lambda i: (type(lbls[i]).__name__, repr(lbls[i]),)
+        )
+
+
+class ConfusionAccumulator(object):
+    """
+    Builds a confusion matrix from batches of targets and predictions so
+    per-label metrics can be computed over very large evaluations without
+    re-encoding the labels for every metric.
+
+    EXAMPLE
+    -------
+    acc = ConfusionAccumulator()
+    for tgts, preds in batches:
+        acc.update(tgts, preds)
+    md = acc.lbl_metric_dict()
+    find_problem_cats_from_metric_dict(md)
+    -------
+    """
+    def __init__(self):
+        self.lbls = []
+        self.code_on_lbl = {}
+        self.cmtx = np.zeros((0, 0,), dtype=np.int64)
+
+    def _code(self, lbl):
+        code = self.code_on_lbl.get(lbl)
+        if code is None:
+            code = len(self.lbls)
+            self.code_on_lbl[lbl] = code
+            # numpy scalars, EG: from an array of labels, are kept as the
+            # python objects they hold
+            if isinstance(lbl, np.generic):
+                lbl = lbl.item()
+            self.lbls.append(lbl)
+        return code
+
+    def _encode(self, lbls):
+        # labels are looked up as python objects, since a numpy array of
+        # them would turn mixed labels such as 1 and '1' into one string
+        return np.fromiter(
+            (self._code(lbl) for lbl in lbls), dtype=np.int64, count=len(lbls)
+        )
+
+    def _grow(self):
+        numlbls = len(self.lbls)
+        if numlbls == self.cmtx.shape[0]:
+            return
+        cmtx = np.zeros((numlbls, numlbls,), dtype=self.cmtx.dtype)
+        cmtx[:self.cmtx.shape[0], :self.cmtx.shape[1]] = self.cmtx
+        self.cmtx = cmtx
+
+    def update(self, tgts, preds):
+        """
+        :type tgts: list<obj>
+        :type preds: list<obj>
+        """
+        if len(tgts) != len(preds):
+            raise IndexError('len(tgts) != len(preds)')
+        if len(tgts) == 0:
+            return
+        self.update_codes(self._encode(tgts), self._encode(preds))
+
+    def update_codes(self, tgt_codes, pred_codes):
+        """
+        Add a batch of labels that are already integer coded. Codes are
+        indices into "lbls", so labels must have been registered by
+        "update" or "add_lbls" first.
+
+        :type tgt_codes: numpy.ndarray
+        :type pred_codes: numpy.ndarray
+        """
+        self._grow()
+        numlbls = len(self.lbls)
+        flat = np.asarray(tgt_codes) * numlbls + np.asarray(pred_codes)
+        self.cmtx += np.bincount(flat, minlength=numlbls * numlbls).reshape(
+            numlbls, numlbls
+        )
+
+    def add_lbls(self, lbls):
+        """
+        :type lbls: list<obj>
+        :rtype: numpy.ndarray
+        :returns: codes of "lbls"
+        """
+        codes = self._encode(lbls)
+        self._grow()
+        return codes
+
+    def sorted_confusion(self):
+        """
+        :rtype: tuple(list<obj>, numpy.ndarray,)
+        :returns: labels in sorted order and the confusion matrix with rows
+            and columns in that order
+        """
+        order = _sorted_lbl_ixs(self.lbls)
+        self._grow()
+        return (
+            [self.lbls[i] for i in order],
+            self.cmtx[np.ix_(order, order)],
+        )
+
+    def metrics(self):
+        """
+        :rtype: tuple(list<obj>, dict<str, numpy.ndarray>,)
+        :returns: sorted labels and each metric array in that order
+        """
+        lbls, cmtx = self.sorted_confusion()
+        return lbls, metrics_from_confusion(cmtx)
+
+    def lbl_metric_dict(self, metric_names=('f1', 'support',)):
+        """
+        Metrics in the same layout as mk_lbl_metric_dict. With the default
+        "metric_names", the result can be passed straight to
+        find_problem_cats_from_metric_dict.
+
+        :type metric_names: tuple<str>
+        :param metric_names: any of 'precision', 'recall', 'f1', 'support'
+        :rtype: dict<obj, list<float>>
+        """
+        lbls, metric_on_name = self.metrics()
+        md = {}
+        for i in range(len(lbls)):
+            md[lbls[i]] = [float(metric_on_name[n][i]) for n in metric_names]
+        return md
+
+
+def _bootstrap_metrics(cmtx, metric_names, numreps, seed_seq):
+    # Resampling n (target, prediction) pairs with replacement and counting
+    # them is the same as drawing the confusion cells from a multinomial
+    # with the observed cell proportions, so each replicate costs
+    # O(nonzero cells) rather than O(n) no matter how many predictions
+    # there are. Cells that are zero are never drawn, so only the nonzero
+    # ones are sampled, "BOOTSTRAP_CHUNK_CELLS" at a time, and their counts
+    # are summed into per-label totals.
+    rng = np.random.default_rng(seed_seq)
+    numlbls = cmtx.shape[0]
+    rows, cols = np.nonzero(cmtx)
+    counts = cmtx[rows, cols].astype(np.float64)
+    total = int(counts.sum())
+    on_diag = np.nonzero(rows == cols)[0]
+    tp_lbls = rows[on_diag]
+    cell_rng = np.arange(len(rows))
+    row_ind = sparse.csr_matrix(
+        (np.ones(len(rows)), (cell_rng, rows,)), shape=(len(rows), numlbls)
+    )
+    col_ind = sparse.csr_matrix(
+        (np.ones(len(rows)), (cell_rng, cols,)), shape=(len(rows), numlbls)
+    )
+    chunk = max(1, BOOTSTRAP_CHUNK_CELLS // max(len(rows), numlbls))
+    reps_on_name = {n: [] for n in metric_names}
+    for beg in range(0, numreps, chunk):
+        size = min(chunk, numreps - beg)
+        cells = rng.multinomial(total, counts / total, size=size)
+        cells = cells.astype(np.float64)
+        tp = np.zeros((size, numlbls))
+        tp[:, tp_lbls] = cells[:, on_diag]
+        metric_on_name = _metrics_from_totals(
+            tp, row_ind.T.dot(cells.T).T, col_ind.T.dot(cells.T).T
+        )
+        for n in metric_names:
+            reps_on_name[n].append(metric_on_name[n])
+    return {n: np.concatenate(reps_on_name[n]) for n in metric_names}
+
+
+def _bootstrap_metrics_star(args):
+    return _bootstrap_metrics(*args)
+
+
+def bootstrap_metric_intervals(
+    cmtx, metric_names=('f1', 'support',), numreps=1000, alpha=.05, seed=0,
+    numprocs=1
+):
+    """
+    Percentile bootstrap intervals for per-label metrics. Replicates are
+    drawn and scored in chunks over the nonzero cells of "cmtx" only.
+
+    :type cmtx: numpy.ndarray
+    :param cmtx: confusion matrix, rows are targets and columns predictions
+    :type metric_names: tuple<str>
+    :type numreps: int
+    :type alpha: float
+    :param alpha: the intervals cover 1 - alpha of the replicates
+    :type seed: int
+    :type numprocs: int
+    :param numprocs: replicates are split evenly across this many processes
+    :rtype: dict<str, tuple(numpy.ndarray, numpy.ndarray,)>
+    :returns: lower and upper bound arrays, in the label order of "cmtx"
+    """
+    cmtx = np.asarray(cmtx)
+    if cmtx.sum() == 0:
+        raise ValueError('cmtx is empty')
+    numprocs = max(1, min(numprocs, numreps))
+    seed_seqs = np.random.SeedSequence(seed).spawn(numprocs)
+    reps_per_proc = [numreps // numprocs] * numprocs
+    for i in range(numreps % numprocs):
+        reps_per_proc[i] += 1
+    args = [
+        (cmtx, metric_names, reps_per_proc[i], seed_seqs[i],)
+        for i in range(numprocs)
+    ]
+    if numprocs == 1:
+        results = [_bootstrap_metrics_star(args[0])]
+    else:
+        with multiprocessing.Pool(numprocs) as pool:
+            results = pool.map(_bootstrap_metrics_star, args)
+
+    bnds_on_name = {}
+    for n in metric_names:
+        reps = np.concatenate([r[n] for r in results])
+        lo, hi = np.percentile(
+            reps, [100.0 * alpha / 2, 100.0 * (1 - alpha / 2)], axis=0
+        )
+        bnds_on_name[n] = (lo, hi,)
+    return bnds_on_name
+
+
+def bootstrap_lbl_metric_dict(
+    tgts, preds, metric_names=('f1', 'support',), numreps=1000, alpha=.05,
+    seed=0, numprocs=1
+):
+    """
+    Per-label metrics with bootstrap confidence intervals.
+
+    :type tgts: list<obj>
+    :type preds: list<obj>
+    :type metric_names: tuple<str>
+    :param metric_names: any of 'precision', 'recall', 'f1', 'support'
+    :type numreps: int
+    :type alpha: float
+    :type seed: int
+    :type numprocs: int
+    :rtype: tuple(dict<obj, list<float>>, dict<obj, list<tuple(float, float)>>)
+    :returns: the metric dict, laid out as in mk_lbl_metric_dict, and a dict
+        of (lower, upper) intervals in the same layout
+    """
+    acc = ConfusionAccumulator()
+    acc.update(tgts, preds)
+    lbls, cmtx = acc.sorted_confusion()
+    bnds_on_name = bootstrap_metric_intervals(
+        cmtx, metric_names, numreps, alpha, seed, numprocs
+    )
+    md = acc.lbl_metric_dict(metric_names)
+    ci_md = {}
+    for i in range(len(lbls)):
+        ci_md[lbls[i]] = [
+            (float(bnds_on_name[n][0][i]), float(bnds_on_name[n][1][i]),)
+            for n in metric_names
+        ]
+    return md, ci_md
@@ -0,0 +1,221 @@
+import hashlib
+import numpy as np
+from lib.saxutil import cntr_util
+
+
+def obj_id(obj):
+    """
+    Stable 32 bit integer for an object. Integers, such as FeatureMap
+    features, are used as is. Anything else is hashed from its repr, so the
+    id does not change between processes the way hash() does.
+
+    :type obj: obj
+    :rtype: int
+    """
+    if isinstance(obj, (int, np.integer)):
+        return int(obj) & 0xFFFFFFFF
+    dig = hashlib.blake2b(repr(obj).encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(dig, 'little')
+
+
+class MinHasher(object):
+    """
+    Generates MinHash signatures for sets of objects. Each of the "numperm"
+    hash functions is a multiply-shift hash over the 32 bit object ids, and
+    all of them are applied to a set in one numpy operation.
+    """
+    def __init__(self, numperm=128, seed=0):
+        """
+        :type numperm: int
+        :type seed: int
+        """
+        rng = np.random.RandomState(seed)
+        self.numperm = numperm
+        # multiply-shift requires an odd multiplier
+        self.a = (
+            rng.randint(0, 2 ** 63 - 1, numperm, dtype=np.int64)
+            .astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        )
+        self.b = rng.randint(0, 2 ** 63 - 1, numperm, dtype=np.int64).astype(
+            np.uint64
+        )
+
+    def signature(self, objs):
+        """
+        :type objs: iterable<obj>
+        :rtype: numpy.ndarray
+        :returns: uint64 array of length numperm. An empty set has every
+            value set to the maximum.
+        """
+        ids = np.fromiter(
+            set([obj_id(o) for o in objs]), dtype=np.uint64
+        )
+        if len(ids) == 0:
+            return np.full(self.numperm, np.iinfo(np.uint64).max, np.uint64)
+        hashed = (
+            self.a[:, np.newaxis] * ids[np.newaxis, :] + self.b[:, np.newaxis]
+        ) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def signatures(self, obj_sets):
+        """
+        :type obj_sets: list<iterable<obj>>
+        :rtype: numpy.ndarray
+        :returns: array of shape (len(obj_sets), numperm)
+        """
+        sigs = np.empty((len(obj_sets), self.numperm), dtype=np.uint64)
+        for i in range(len(obj_sets)):
+            sigs[i] = self.signature(obj_sets[i])
+        return sigs
+
+
+def est_jaccard(sig0, sig1):
+    """
+    :type sig0: numpy.ndarray
+    :type sig1: numpy.ndarray
+    :rtype: float
+    """
+    return float(np.mean(sig0 == sig1))
+
+
+def band_params(numperm, threshold):
+    """
+    Pick the number of bands and rows per band whose S-curve midpoint,
+    (1 / bands) ^ (1 / rows), is closest to "threshold".
+
+    :type numperm: int
+    :type threshold: float
+    :rtype: tuple(int, int,)
+    """
+    if not 0.0 < threshold < 1.0:
+        raise ValueError('threshold must be between 0 and 1')
+    best = None
+    for rows in range(1, numperm + 1):
+        bands = numperm // rows
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or err < best[0]:
+            best = (err, bands, rows,)
+    return best[1], best[2]
+
+
+class _DisjointSet(object):
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        self.parent[self.find(x)] = self.find(y)
+
+
+class LshIndex(object):
+    """
+    Banded LSH index over MinHash signatures. Signatures that agree on every
+    row of at least one band land in the same bucket and become candidate
+    duplicates, so candidates are found without comparing every pair.
+
+    EXAMPLE
+    -------
+    mh = MinHasher()
+    lsh = LshIndex(threshold=.8, numperm=mh.numperm)
+    for i in range(len(docs)):
+        lsh.add(i, mh.signature(docs[i]))
+    lsh.dup_clusters()
+    # -> [[0, 7], [3, 4, 12], ...]
+    -------
+    """
+    def __init__(self, threshold=.8, numperm=128):
+        """
+        :type threshold: float
+        :param threshold: approximate Jaccard similarity above which two sets
+            are treated as duplicates
+        :type numperm: int
+        """
+        self.threshold = threshold
+        self.numbands, self.numrows = band_params(numperm, threshold)
+        self.buckets = [{} for i in range(self.numbands)]
+        self.sig_on_key = {}
+
+    def _band_keys(self, sig):
+        keys = []
+        for band in range(self.numbands):
+            beg = band * self.numrows
+            keys.append(sig[beg:beg + self.numrows].tobytes())
+        return keys
+
+    def add(self, key, sig):
+        """
+        :type key: obj
+        :type sig: numpy.ndarray
+        """
+        if key in self.sig_on_key:
+            raise ValueError('key already present: ' + str(key))
+        self.sig_on_key[key] = sig
+        band_keys = self._band_keys(sig)
+        for band in range(self.numbands):
+            self.buckets[band].setdefault(band_keys[band], []).append(key)
+
+    def candidates(self, sig):
+        """
+        :type sig: numpy.ndarray
+        :rtype: set<obj>
+        """
+        cands = set()
+        band_keys = self._band_keys(sig)
+        for band in range(self.numbands):
+            cands.update(self.buckets[band].get(band_keys[band], []))
+        return cands
+
+    def dup_clusters(self, cntr_on_key=None, min_cos=None):
+        """
+        Group keys into clusters of near duplicates. A key sharing a bucket
+        with a cluster's representative joins that cluster when their
+        estimated Jaccard similarity reaches the threshold. If "cntr_on_key"
+        and "min_cos" are given, candidates must also have an exact cosine
+        similarity of at least "min_cos".
+
+        :type cntr_on_key: dict<obj, Counter>
+        :type min_cos: float
+        :rtype: list<list<obj>>
+        :returns: clusters with more than one key
+        """
+        dsets = _DisjointSet()
+        find = dsets.find
+        for band in range(self.numbands):
+            for keys in self.buckets[band].values():
+                # each key is compared against one representative of every
+                # cluster already found in the bucket, not against every
+                # member, and not at all against its own cluster
+                reps = []
+                for key in keys:
+                    matched = False
+                    for rep in reps:
+                        if find(rep) == find(key):
+                            matched = True
+                        elif self._is_dup((rep, key,), cntr_on_key, min_cos):
+                            dsets.union(rep, key)
+                            matched = True
+                    if not matched:
+                        reps.append(key)
+
+        keys_on_root = {}
+        for key in list(dsets.parent.keys()):
+            keys_on_root.setdefault(dsets.find(key), []).append(key)
+        return [ks for ks in keys_on_root.values() if len(ks) > 1]
+
+    def _is_dup(self, pair, cntr_on_key, min_cos):
+        sim = est_jaccard(self.sig_on_key[pair[0]], self.sig_on_key[pair[1]])
+        if sim < self.threshold:
+            return False
+        if cntr_on_key is None or min_cos is None:
+            return True
+        cos_dist = cntr_util.cosine_dists(
+            [cntr_on_key[pair[0]]], [cntr_on_key[pair[1]]]
+        )[0][0]
+        return 1.0 - cos_dist >= min_cos
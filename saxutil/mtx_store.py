@@ -0,0 +1,160 @@
+"""
+On-disk storage of CSR / CSC matrices. A stored matrix is a directory
+holding the raw indptr, indices and data arrays plus a json header. Opening
+a stored matrix maps the arrays with numpy.memmap, so nothing is read until
+it is used and the pages are shared between processes.
+"""
+import os
+import json
+import numpy as np
+from scipy import sparse
+
+HEADER_FNAME = 'header.json'
+ARR_NAMES = ('indptr', 'indices', 'data',)
+
+
+def _arr_path(dirpath, name):
+    return os.path.join(dirpath, name + '.bin')
+
+
+def read_header(dirpath):
+    """
+    :type dirpath: str
+    :rtype: dict
+    """
+    with open(os.path.join(dirpath, HEADER_FNAME)) as f:
+        return json.loads(f.read())
+
+
+def _write_header(dirpath, header):
+    # replaced in one step, so the header always describes arrays that were
+    # completely written
+    fpath = os.path.join(dirpath, HEADER_FNAME)
+    with open(fpath + '.tmp', 'w') as f:
+        f.write(json.dumps(header))
+    os.replace(fpath + '.tmp', fpath)
+
+
+def save_mtx(mtx, dirpath):
+    """
+    :type mtx: sparse scipy matrix
+    :param mtx: CSC matrices are stored as CSC, everything else as CSR
+    :type dirpath: str
+    """
+    if os.path.exists(dirpath):
+        raise IOError('dirpath:\t' + str(dirpath) + ' already exists')
+    fmt = 'csc' if sparse.isspmatrix_csc(mtx) else 'csr'
+    mtx = mtx.asformat(fmt)
+    if not mtx.has_sorted_indices:
+        # asformat returns "mtx" itself when it is already in "fmt"
+        mtx = mtx.sorted_indices()
+    os.mkdir(dirpath)
+    for name in ARR_NAMES:
+        getattr(mtx, name).tofile(_arr_path(dirpath, name))
+    _write_header(dirpath, {
+        'format': fmt,
+        'shape': list(mtx.shape),
+        'dtype': {n: getattr(mtx, n).dtype.str for n in ARR_NAMES},
+    })
+
+
+def _load_arr(dirpath, name, dtype, mode):
+    if os.path.getsize(_arr_path(dirpath, name)) == 0:
+        # numpy.memmap cannot map an empty file
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(_arr_path(dirpath, name), dtype=dtype, mode=mode)
+
+
+def _stored_lens(header, indptr):
+    numptrs = header['shape'][0 if header['format'] == 'csr' else 1] + 1
+    return numptrs, int(indptr[numptrs - 1])
+
+
+def load_mtx(dirpath, mode='r'):
+    """
+    Open a stored matrix without reading it into memory.
+
+    :type dirpath: str
+    :type mode: str
+    :param mode: numpy.memmap mode. 'r' is read only. 'c' is copy on write.
+    :rtype: scipy.sparse.csr_matrix or scipy.sparse.csc_matrix
+    """
+    header = read_header(dirpath)
+    arrs = [
+        _load_arr(dirpath, n, np.dtype(header['dtype'][n]), mode)
+        for n in ARR_NAMES
+    ]
+    if header['format'] == 'csc':
+        cls = sparse.csc_matrix
+    else:
+        cls = sparse.csr_matrix
+    # passing the arrays to the constructor lets scipy downcast int64
+    # indices to int32 copies, which reads them into memory. The memmaps are
+    # assigned to an empty matrix instead.
+    # the arrays are cut to the lengths the header gives, in case an
+    # append_rows call did not finish
+    numptrs, nnz = _stored_lens(header, arrs[0])
+    mtx = cls(tuple(header['shape']), dtype=arrs[2].dtype)
+    mtx.indptr, mtx.indices, mtx.data = (
+        arrs[0][:numptrs], arrs[1][:nnz], arrs[2][:nnz],
+    )
+    return mtx
+
+
+def append_rows(dirpath, block):
+    """
+    Append the rows of "block" to a stored CSR matrix. The block is cast to
+    the stored dtypes.
+
+    :type dirpath: str
+    :type block: sparse scipy matrix
+    """
+    header = read_header(dirpath)
+    if header['format'] != 'csr':
+        raise ValueError('rows can only be appended to a csr matrix')
+    numrows, numcols = header['shape']
+    if block.shape[1] != numcols:
+        raise ValueError('block.shape[1] != stored number of columns')
+    block = sparse.csr_matrix(block)
+    if not block.has_sorted_indices:
+        # csr_matrix shares the arrays of a CSR "block"
+        block = block.sorted_indices()
+    dtypes = {n: np.dtype(header['dtype'][n]) for n in ARR_NAMES}
+
+    numptrs, nnz = _stored_lens(
+        header, _load_arr(dirpath, 'indptr', dtypes['indptr'], 'r')
+    )
+    if nnz + block.nnz > np.iinfo(dtypes['indptr']).max:
+        raise ValueError('appended values overflow the stored indptr dtype')
+    # drop whatever an earlier call that did not finish left past the
+    # lengths in the header. The header is written last.
+    for name, length in zip(ARR_NAMES, (numptrs, nnz, nnz,)):
+        os.truncate(_arr_path(dirpath, name), length * dtypes[name].itemsize)
+    indptr = block.indptr[1:].astype(dtypes['indptr']) + nnz
+    with open(_arr_path(dirpath, 'indptr'), 'ab') as f:
+        indptr.tofile(f)
+    with open(_arr_path(dirpath, 'indices'), 'ab') as f:
+        block.indices.astype(dtypes['indices']).tofile(f)
+    with open(_arr_path(dirpath, 'data'), 'ab') as f:
+        block.data.astype(dtypes['data']).tofile(f)
+    header['shape'] = [numrows + block.shape[0], numcols]
+    _write_header(dirpath, header)
+
+
+def row_slice(mtx, beg, end):
+    """
+    Rows beg to end of a CSR matrix as a new CSR matrix whose indices and
+    data are views of the original arrays, so a memory mapped matrix is only
+    read for the requested rows.
+
+    :type mtx: scipy.sparse.csr_matrix
+    :type beg: int
+    :type end: int
+    :rtype: scipy.sparse.csr_matrix
+    """
+    beg, end = max(0, beg), min(end, mtx.shape[0])
+    lo, hi = mtx.indptr[beg], mtx.indptr[end]
+    return sparse.csr_matrix(
+        (mtx.data[lo:hi], mtx.indices[lo:hi], mtx.indptr[beg:end + 1] - lo),
+        shape=(max(0, end - beg), mtx.shape[1]), copy=False
+    )
@@ -1,26 +1,201 @@
+import mmap
+import itertools
+import multiprocessing
 import numpy as np
 from scipy import sparse
+from lib.saxutil import mtx_store
+
+
+def is_memmapped(mtx):
+    """
+    :type mtx: sparse scipy matrix
+    :rtype: bool
+    :returns: True if the values of "mtx" are memory mapped, as with
+        matrices opened by mtx_store.load_mtx
+    """
+    base = getattr(mtx, 'data', None)
+    while base is not None:
+        # scipy wraps the memmap in a plain ndarray view
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, 'base', None)
+    return False
 
 
 def resultant(mtx):
     """
     :type param: sparse scipy matrix
     """
+    if is_memmapped(mtx) and sparse.isspmatrix_csr(mtx):
+        return _sum_arrs(_sparse_resultant(b) for b in iter_row_blocks(mtx))
     if sparse.issparse(mtx):
-        return np.array(mtx.sum(axis=0))[0]
+        return _sparse_resultant(mtx)
     return mtx.sum(axis=0)
 
 
+def _sparse_resultant(mtx):
+    return np.array(mtx.sum(axis=0))[0]
+
+
 def resultant_cosine_sims(mtx):
+    if is_memmapped(mtx):
+        return chunked_resultant_cosine_sims(mtx)
     res = resultant(mtx)
     res_norm = np.linalg.norm(res)
     row_norms = sparse.linalg.norm(mtx, axis=1)
     return mtx.dot(res) / (row_norms * res_norm)
 
 
+def iter_row_blocks(mtx, block_size=100000):
+    """
+    :type mtx: sparse scipy matrix
+    :param mtx: generally CSR. A CSR matrix whose arrays are numpy.memmap
+        objects is sliced without loading the rest of the matrix.
+    :type block_size: int
+    :rtype: generator<scipy.sparse.csr_matrix>
+    """
+    for beg in range(0, mtx.shape[0], block_size):
+        if sparse.isspmatrix_csr(mtx):
+            yield mtx_store.row_slice(mtx, beg, beg + block_size)
+        else:
+            yield mtx[beg:beg + block_size]
+
+
+def _block_cosine_sims(block, res, res_norm):
+    block = sparse.csr_matrix(block)
+    row_norms = np.sqrt(np.asarray(block.multiply(block).sum(axis=1)))[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return block.dot(res) / (row_norms * res_norm)
+
+
+_worker_res = None
+
+
+def _init_sims_worker(res, res_norm):
+    global _worker_res
+    _worker_res = (res, res_norm,)
+
+
+def _worker_block_cosine_sims(block):
+    return _block_cosine_sims(block, _worker_res[0], _worker_res[1])
+
+
+def _sum_arrs(arrs):
+    total = None
+    for a in arrs:
+        total = a if total is None else total + a
+    return total
+
+
+def _iter_block_cosine_sims(blocks, numprocs, block_size):
+    if callable(blocks):
+        get_blocks = blocks
+    else:
+        get_blocks = lambda: iter_row_blocks(blocks, block_size)
+
+    # First pass: resultant
+    if numprocs <= 1:
+        res = _sum_arrs(resultant(b) for b in get_blocks())
+    else:
+        with multiprocessing.Pool(numprocs) as pool:
+            res = _sum_arrs(pool.imap(resultant, get_blocks()))
+    if res is None:
+        return
+    res_norm = np.linalg.norm(res)
+
+    # Second pass: similarity of each row to the resultant
+    if numprocs <= 1:
+        for b in get_blocks():
+            yield _block_cosine_sims(b, res, res_norm)
+        return
+    with multiprocessing.Pool(
+        numprocs, initializer=_init_sims_worker, initargs=(res, res_norm,)
+    ) as pool:
+        for sims in pool.imap(_worker_block_cosine_sims, get_blocks()):
+            yield sims
+
+
+def chunked_resultant_cosine_sims(blocks, numprocs=1, block_size=100000):
+    """
+    Same result as resultant_cosine_sims, computed one row block at a time
+    in two passes: one for the resultant and one for the similarities.
+
+    :type blocks: sparse scipy matrix or function
+    :param blocks: a sparse matrix (including a CSR matrix over
+        numpy.memmap arrays) that is split into row blocks of "block_size",
+        or a function taking no arguments that returns a new iterator of row
+        blocks each time it is called.
+    :type numprocs: int
+    :param numprocs: number of processes the blocks are spread across
+    :type block_size: int
+    :rtype: numpy.ndarray
+    """
+    sims = list(_iter_block_cosine_sims(blocks, numprocs, block_size))
+    if len(sims) == 0:
+        return np.array([])
+    return np.concatenate(sims)
+
+
+def _keep_extreme(rows, sims, k, largest):
+    if len(sims) <= k:
+        return rows, sims
+    if largest:
+        keep = np.argpartition(-sims, k - 1)[:k]
+    else:
+        keep = np.argpartition(sims, k - 1)[:k]
+    return rows[keep], sims[keep]
+
+
+def extreme_central_rows(
+    blocks, topk=0, bottomk=0, numprocs=1, block_size=100000
+):
+    """
+    Find the rows most and least similar to the resultant without keeping
+    every similarity. The least central rows are generally outliers. Rows
+    with no values (nan similarity) are ignored.
+
+    :type blocks: sparse scipy matrix or function
+    :param blocks: see chunked_resultant_cosine_sims
+    :type topk: int
+    :type bottomk: int
+    :type numprocs: int
+    :type block_size: int
+    :rtype: tuple(list<tuple(int, float,)>, list<tuple(int, float,)>,)
+    :returns: the "topk" most central rows, highest first, and the
+        "bottomk" least central rows, lowest first, as (row, sim) pairs
+    """
+    top_rows, top_sims = np.array([], dtype=np.int64), np.array([])
+    bot_rows, bot_sims = np.array([], dtype=np.int64), np.array([])
+    offset = 0
+    for sims in _iter_block_cosine_sims(blocks, numprocs, block_size):
+        rows = np.arange(offset, offset + len(sims))
+        offset += len(sims)
+        valid = ~np.isnan(sims)
+        rows, sims = rows[valid], sims[valid]
+        if topk > 0:
+            top_rows, top_sims = _keep_extreme(
+                np.concatenate([top_rows, rows]),
+                np.concatenate([top_sims, sims]), topk, True
+            )
+        if bottomk > 0:
+            bot_rows, bot_sims = _keep_extreme(
+                np.concatenate([bot_rows, rows]),
+                np.concatenate([bot_sims, sims]), bottomk, False
+            )
+    top = list(zip(top_rows.tolist(), top_sims.tolist()))
+    top.sort(key=lambda t: -t[1])
+    bot = list(zip(bot_rows.tolist(), bot_sims.tolist()))
+    bot.sort(key=lambda t: t[1])
+    return top, bot
+
+
 def col_count_from_col_lists(col_lists):
     """
+    Number of columns needed to hold every column index in "col_lists",
+    i.e. the maximum index plus one.
+
     :type col_lists: list<list<int>>
+    :rtype: int
     """
     maxcol = None
     for l in col_lists:
@@ -29,16 +204,130 @@ def col_count_from_col_lists(col_lists):
         cur_max = max(l)
         if maxcol is None or maxcol < cur_max:
             maxcol = cur_max
-    return maxcol
+    if maxcol is None:
+        return 0
+    return maxcol + 1
 
 
-def mtx_from_col_lists(col_lists):
+def mtx_from_col_lists(col_lists, dtype=np.float64):
     """
+    Cell by cell lil_matrix construction. Use csr_from_col_lists for large
+    inputs.
+
     :type col_lists: list<list<int>>
+    :type dtype: numpy.dtype
     """
     numcols = col_count_from_col_lists(col_lists)
-    mtx = sparse.lil_matrix((len(col_lists), numcols))
+    mtx = sparse.lil_matrix((len(col_lists), numcols), dtype=dtype)
     for row in range(len(col_lists)):
         for col in col_lists[row]:
             mtx[row, col] += 1
     return mtx
+
+
+def csr_from_arrs(data, indices, indptr, shape, idx_dtype=None):
+    """
+    Same as scipy.sparse.csr_matrix((data, indices, indptr), shape=shape),
+    except that the index arrays keep the type "idx_dtype". The constructor
+    alone downcasts int64 indices to int32 whenever their values fit.
+
+    :type data: numpy.ndarray
+    :type indices: numpy.ndarray
+    :type indptr: numpy.ndarray
+    :type shape: tuple(int, int,)
+    :type idx_dtype: numpy.dtype
+    :param idx_dtype: by default scipy picks one
+    :rtype: scipy.sparse.csr_matrix
+    """
+    if idx_dtype is None:
+        return sparse.csr_matrix((data, indices, indptr,), shape=shape)
+    mtx = sparse.csr_matrix(shape, dtype=data.dtype)
+    mtx.data = data
+    mtx.indices = np.asarray(indices, dtype=idx_dtype)
+    mtx.indptr = np.asarray(indptr, dtype=idx_dtype)
+    mtx.check_format(full_check=False)
+    return mtx
+
+
+def csr_from_flat_cols(
+    cols, offsets, numcols=None, dtype=np.float64, idx_dtype=None
+):
+    """
+    Build a count matrix from a flat array of column indices. The columns of
+    row "i" are cols[offsets[i]:offsets[i + 1]]. Repeated columns within a
+    row are summed.
+
+    :type cols: numpy.ndarray
+    :type offsets: numpy.ndarray
+    :param offsets: array of length numrows + 1, starting at 0
+    :type numcols: int
+    :param numcols: defaults to the maximum column index plus one
+    :type dtype: numpy.dtype
+    :param dtype: type of the matrix values. EG: numpy.float32 or numpy.int32
+    :type idx_dtype: numpy.dtype
+    :param idx_dtype: type of the column indices and row pointers. EG:
+        numpy.int32. By default scipy picks one.
+    :rtype: scipy.sparse.csr_matrix
+    """
+    # copied, since sum_duplicates sorts and compacts the index arrays in
+    # place and would otherwise change the caller's arrays
+    cols = np.array(cols, dtype=idx_dtype, copy=True)
+    offsets = np.array(offsets, dtype=idx_dtype, copy=True)
+    if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(cols):
+        raise ValueError('offsets must start at 0 and end at len(cols)')
+    if numcols is None:
+        numcols = int(cols.max()) + 1 if len(cols) > 0 else 0
+    mtx = csr_from_arrs(
+        np.ones(len(cols), dtype=dtype), cols, offsets,
+        (len(offsets) - 1, numcols,), idx_dtype
+    )
+    mtx.sum_duplicates()
+    return mtx
+
+
+def csr_from_col_lists(
+    col_lists, numcols=None, dtype=np.float64, idx_dtype=None
+):
+    """
+    Vectorized equivalent of mtx_from_col_lists that returns a CSR matrix.
+
+    :type col_lists: list<list<int>>
+    :type numcols: int
+    :type dtype: numpy.dtype
+    :type idx_dtype: numpy.dtype
+    :rtype: scipy.sparse.csr_matrix
+    """
+    lens = np.fromiter(
+        (len(l) for l in col_lists), dtype=np.int64, count=len(col_lists)
+    )
+    offsets = np.zeros(len(col_lists) + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    cols = np.fromiter(
+        itertools.chain.from_iterable(col_lists), dtype=np.int64,
+        count=offsets[-1]
+    )
+    return csr_from_flat_cols(cols, offsets, numcols, dtype, idx_dtype)
+
+
+def grouped_resultants(mtx, grp_ixs, numgrps=None):
+    """
+    Sum the rows of "mtx" that share a group index. Row "g" of the returned
+    matrix is the resultant of every row "i" where grp_ixs[i] == g. This is
+    done with a single sparse product rather than one resultant per group.
+
+    :type mtx: sparse scipy matrix
+    :type grp_ixs: list<int>
+    :param grp_ixs: group index of each row in "mtx"
+    :type numgrps: int
+    :rtype: scipy.sparse.csr_matrix
+    """
+    grp_ixs = np.asarray(grp_ixs, dtype=np.int64)
+    if len(grp_ixs) != mtx.shape[0]:
+        raise IndexError('len(grp_ixs) != mtx.shape[0]')
+    if numgrps is None:
+        numgrps = int(grp_ixs.max()) + 1 if len(grp_ixs) > 0 else 0
+    indicator = sparse.csr_matrix(
+        (np.ones(len(grp_ixs)), (grp_ixs, np.arange(len(grp_ixs)))),
+        shape=(numgrps, mtx.shape[0])
+    )
+    return sparse.csr_matrix(indicator.dot(mtx))
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def do_ranges_overlap(b0, e0, b1, e1):
     """
     b0 and e0 are one pair of start and end boundaries
@@ -41,17 +44,171 @@ def subsumed_bound_indices(bnds):
     indices where the numeric range is completely subsumed by the numeric
     range of another pair in the list.
 
+    Pair i is returned when is_subsumed(bnds[i], bnds[j]) holds for some
+    other pair j, i.e. j is longer and one of its ends falls inside pair i.
+    Rather than comparing every pair, the pairs are swept from longest to
+    shortest while the ends of the longer pairs are counted in a Fenwick
+    tree, which takes O(n log n).
+
     :type bnds: list<tuple(int, int,)>
     :rtype: set<int>
     """
+    for b, e in bnds:
+        assert(b <= e)
+    coords = sorted(set([b for b, e in bnds] + [e for b, e in bnds]))
+    pos_on_coord = {coords[i]: i for i in range(len(coords))}
+    tree = _FenwickTree(len(coords))
+
+    order = sorted(range(len(bnds)), key=lambda i: bnds[i][0] - bnds[i][1])
     indices = set()
-    for i in range(len(bnds)):
-        for j in range(len(bnds)):
-            assert(bnds[i][0] <= bnds[i][1] and bnds[j][0] <= bnds[j][1])
-            if i == j:
-                continue
-            if is_subsumed(bnds[i][0], bnds[i][1], bnds[j][0], bnds[j][1]):
+    grp_beg = 0
+    while grp_beg < len(order):
+        size = bnds[order[grp_beg]][1] - bnds[order[grp_beg]][0]
+        grp_end = grp_beg
+        while (
+            grp_end < len(order) and
+            bnds[order[grp_end]][1] - bnds[order[grp_end]][0] == size
+        ):
+            grp_end += 1
+        # Only strictly longer pairs are in the tree at this point
+        for i in order[grp_beg:grp_end]:
+            lo, hi = pos_on_coord[bnds[i][0]], pos_on_coord[bnds[i][1]]
+            if tree.range_sum(lo, hi) > 0:
                 indices.add(i)
-            elif is_subsumed(bnds[j][0], bnds[j][1], bnds[i][0], bnds[i][1]):
-                indices.add(j)
-    return indices
\ No newline at end of file
+        for i in order[grp_beg:grp_end]:
+            tree.add(pos_on_coord[bnds[i][0]], 1)
+            tree.add(pos_on_coord[bnds[i][1]], 1)
+        grp_beg = grp_end
+    return indices
+
+
+class _FenwickTree(object):
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, pos, val):
+        pos += 1
+        while pos < len(self.tree):
+            self.tree[pos] += val
+            pos += pos & -pos
+
+    def prefix_sum(self, pos):
+        """
+        Sum of positions 0 to pos - 1
+        """
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def range_sum(self, lo, hi):
+        """
+        Sum of positions lo to hi, inclusive
+        """
+        return self.prefix_sum(hi + 1) - self.prefix_sum(lo)
+
+
+class RangeIndex(object):
+    """
+    Static index over integer ranges for answering many overlap and
+    containment queries at once. Ranges are inclusive at both ends, as in
+    do_ranges_overlap.
+
+    The ranges are sorted by start. Any range that can overlap or contain a
+    query starts within the length of the longest range of the query, so
+    each query only scans that window of the sorted starts. Counting
+    overlaps does not scan at all.
+
+    EXAMPLE
+    -------
+    ri = RangeIndex([(0, 2), (4, 9), (5, 6)])
+    ri.overlapping([(1, 4), (7, 7)])
+    # -> [[0, 1], [1]]
+    ri.containing([(5, 6)])
+    # -> [[1, 2]]
+    -------
+    """
+    def __init__(self, bnds):
+        """
+        :type bnds: list<tuple(int, int,)>
+        """
+        arr = np.array(bnds, dtype=np.int64).reshape(-1, 2)
+        if np.any(arr[:, 0] > arr[:, 1]):
+            raise ValueError('range start is greater than range end')
+        self.order = np.argsort(arr[:, 0], kind='stable')
+        self.begs = arr[self.order, 0]
+        self.ends = arr[self.order, 1]
+        self.sorted_ends = np.sort(arr[:, 1])
+        self.maxlen = int((arr[:, 1] - arr[:, 0]).max()) if len(arr) else 0
+
+    def __len__(self):
+        return len(self.begs)
+
+    def _queries(self, qbnds):
+        q = np.array(qbnds, dtype=np.int64).reshape(-1, 2)
+        return q[:, 0], q[:, 1]
+
+    def _scan(self, qbnds, win_lo, win_hi, keep):
+        qbegs, qends = self._queries(qbnds)
+        los = np.searchsorted(self.begs, win_lo(qbegs, qends), 'left')
+        his = np.searchsorted(self.begs, win_hi(qbegs, qends), 'right')
+        res = []
+        for i in range(len(qbegs)):
+            begs = self.begs[los[i]:his[i]]
+            ends = self.ends[los[i]:his[i]]
+            mask = keep(begs, ends, qbegs[i], qends[i])
+            res.append(sorted(self.order[los[i]:his[i]][mask].tolist()))
+        return res
+
+    def overlap_counts(self, qbnds):
+        """
+        :type qbnds: list<tuple(int, int,)>
+        :rtype: numpy.ndarray
+        :returns: number of ranges overlapping each query
+        """
+        qbegs, qends = self._queries(qbnds)
+        # every range starting at or before the query end overlaps, except
+        # the ones that also end before the query starts
+        started = np.searchsorted(self.begs, qends, 'right')
+        ended = np.searchsorted(self.sorted_ends, qbegs, 'left')
+        return started - ended
+
+    def overlapping(self, qbnds):
+        """
+        :type qbnds: list<tuple(int, int,)>
+        :rtype: list<list<int>>
+        :returns: indices of the ranges overlapping each query
+        """
+        return self._scan(
+            qbnds,
+            lambda qb, qe: qb - self.maxlen,
+            lambda qb, qe: qe,
+            lambda b, e, qb, qe: e >= qb
+        )
+
+    def containing(self, qbnds):
+        """
+        :type qbnds: list<tuple(int, int,)>
+        :rtype: list<list<int>>
+        :returns: indices of the ranges that contain each query
+        """
+        return self._scan(
+            qbnds,
+            lambda qb, qe: qe - self.maxlen,
+            lambda qb, qe: qb,
+            lambda b, e, qb, qe: e >= qe
+        )
+
+    def contained_in(self, qbnds):
+        """
+        :type qbnds: list<tuple(int, int,)>
+        :rtype: list<list<int>>
+        :returns: indices of the ranges inside each query
+        """
+        return self._scan(
+            qbnds,
+            lambda qb, qe: qb,
+            lambda qb, qe: qe,
+            lambda b, e, qb, qe: e <= qe
+        )
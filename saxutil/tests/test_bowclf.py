@@ -0,0 +1,59 @@
+import functools
+from lib.saxutil import bowclf, centroid
+from lib.saxutil.txt_proc import tkn_transform, par_pipeline
+
+DOCS = [
+    ('the cat sat on the mat', 'pets',),
+    ('stocks fell 3 % today', 'markets',),
+    ('a dog chased the cat', 'pets',),
+    ('bond yields rose again', 'markets',),
+    ('the parrot talked', 'birds',),
+] * 4
+
+
+def mk_pipe():
+    return [
+        tkn_transform.LowerCaseReplacer(),
+        tkn_transform.StopWordFilter({'the', 'a', 'on'}),
+    ]
+
+
+def test_add_trn_doc_stream_with_buffering_stage():
+    ref = bowclf.add_trn_docs(
+        [d for d, l in DOCS], [l for d, l in DOCS], mk_pipe(), str.split
+    )
+    # several documents per chunk and two workers, so the stage reads
+    # documents well ahead of the results it yields
+    iter_method = functools.partial(
+        par_pipeline.iter_pipeline_par, numprocs=2, chunk_tkns=8
+    )
+    for method in (tkn_transform.iter_pipeline, iter_method,):
+        trnr = bowclf.add_trn_doc_stream(
+            iter(DOCS), mk_pipe(), str.split, iter_method=method
+        )
+        assert trnr.lbls == ref.lbls
+        assert trnr.ft_cntrs == ref.ft_cntrs
+
+
+def test_memory_report():
+    trnr = bowclf.add_trn_docs(
+        [d for d, l in DOCS], [l for d, l in DOCS], mk_pipe(), str.split
+    )
+    trnr.map_fts_to_cols()
+    rep = trnr.memory_report(trace=True, mdl=centroid.CentroidMdl())
+    mtx = trnr.mk_mtx()
+    assert rep['mtx'] == (
+        mtx.data.nbytes + mtx.indices.nbytes + mtx.indptr.nbytes
+    )
+    assert set(rep['fmap']) == {'vocabulary', 'reverse_index', 'total'}
+    assert set(rep['peak']) == {'mk_mtx', 'to_clf'}
+    parts = ('documents', 'labels', 'ft_bl', 'col_on_ft',)
+    assert rep['total'] == (
+        sum(rep[k] for k in parts) + rep['fmap']['total']
+    )
+
+    clf = trnr.to_clf(centroid.CentroidMdl())
+    assert clf.ft_bl == set()
+    rep = clf.memory_report()
+    assert rep['model']['coefficients'] > 0
+    assert 'peak' not in rep
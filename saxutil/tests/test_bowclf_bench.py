@@ -0,0 +1,44 @@
+import json
+from lib.saxutil.bench import bowclf_bench
+
+PHASES = {
+    'ingest', 'fts_below_freq', 'rm_fts', 'score_fts', 'to_clf',
+    'serialize', 'load', 'predict_single', 'predict_batch',
+}
+
+
+def test_latency_stats():
+    stats = bowclf_bench.latency_stats([.1, .2, .3, .4], numitems=8)
+    assert abs(stats['secs'] - 1.0) < 1e-9
+    assert abs(stats['items_per_sec'] - 8.0) < 1e-9
+    assert abs(stats['p50_secs'] - .25) < 1e-9
+    assert bowclf_bench.latency_stats([0.0])['items_per_sec'] is None
+
+
+def test_run_small():
+    res = bowclf_bench.run(
+        numdocs_list=(60,), vocab_sizes=(300,), numlbls=3
+    )
+    assert len(res['runs']) == 1
+    rn = res['runs'][0]
+    assert (rn['numdocs'], rn['vocab_size'],) == (60, 300,)
+    assert set(rn['phases']) == PHASES
+    for phase, r in rn['phases'].items():
+        assert r['secs'] >= 0
+        assert r['peak_bytes'] >= 0
+    assert rn['phases']['predict_batch']['batch_size'] == 100
+    assert 'p99_secs' in rn['phases']['predict_single']
+
+
+def test_main_writes_json(tmp_path, capsys):
+    out = tmp_path / 'out.json'
+    argv = [
+        '--numdocs', '30', '--vocab-sizes', '200', '--no-mem',
+        '--out', str(out),
+    ]
+    assert bowclf_bench.main(argv) == 0
+    res = json.loads(out.read_text())
+    assert json.loads(capsys.readouterr().out) == res
+    phases = res['runs'][0]['phases']
+    assert set(phases) == PHASES
+    assert all('peak_bytes' not in r for r in phases.values())
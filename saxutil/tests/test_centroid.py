@@ -0,0 +1,36 @@
+import numpy as np
+from scipy import sparse
+from lib.saxutil.centroid import CentroidMdl
+
+
+def test_refit_lbl_adds_longer_lbl():
+    mtx = sparse.csr_matrix(np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 0.0, 1.0],
+    ]))
+    mdl = CentroidMdl().fit(mtx[:2], ['a', 'b'])
+    lbl = 'a_much_longer_label'
+    mdl.refit_lbl(mtx, ['a', 'b', lbl], lbl)
+    assert list(mdl.classes_) == ['a', 'a_much_longer_label', 'b']
+    assert mdl.predict(mtx[2]).tolist() == [lbl]
+    assert mdl.predict(mtx[:2]).tolist() == ['a', 'b']
+
+
+def test_refresh_centroid_matches_refit():
+    from lib.saxutil import bowclf
+    trnr = bowclf.Trnr()
+    for doc, lbl in [
+        ('a b c', 'x',), ('a b', 'x',), ('d e', 'y',), ('d e f', 'y',),
+        ('g h', 'z',),
+    ]:
+        trnr.add_obj_list_doc(doc.split(), lbl)
+    trnr.map_fts_to_cols()
+    clf = trnr.to_clf(CentroidMdl())
+    trnr.add_obj_list_doc('h g g a'.split(), 'z')
+    trnr.refresh_centroid(clf, 'z')
+    ref = trnr.to_clf(CentroidMdl())
+    assert list(clf.mdl.classes_) == list(ref.mdl.classes_)
+    assert np.allclose(
+        clf.mdl.centroids_.toarray(), ref.mdl.centroids_.toarray()
+    )
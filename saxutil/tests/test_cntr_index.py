@@ -0,0 +1,44 @@
+import random
+from collections import Counter
+import numpy as np
+from lib.saxutil import cntr_index, cntr_util
+
+
+def rand_cntrs(num, seed=0):
+    rng = random.Random(seed)
+    vocab = [str(i) for i in range(200)]
+    wgts = [1.0 / (i + 1) for i in range(200)]
+    return [
+        Counter(rng.choices(vocab, wgts, k=rng.randint(1, 30)))
+        for _ in range(num)
+    ]
+
+
+def brute_sims(cntr, cntrs, doc_ids, k):
+    dists = cntr_util.cosine_dists([cntr], [cntrs[i] for i in doc_ids])[0]
+    sims = 1.0 - dists
+    ranked = sorted(zip(doc_ids, sims), key=lambda t: -t[1])
+    return [s for d, s in ranked[:k] if s > 0]
+
+
+def test_query_matches_brute_force():
+    cntrs = rand_cntrs(300)
+    idx = cntr_index.CntrSimIndex()
+    doc_ids = idx.add_all(cntrs)
+    for doc_id in doc_ids[::4]:
+        idx.remove(doc_id)
+    alive = [d for d in doc_ids if d % 4 != 0]
+    for q in rand_cntrs(20, seed=1):
+        got = [s for d, s in idx.query(q, 5)]
+        assert np.allclose(got, brute_sims(q, cntrs, alive, 5))
+
+
+def test_query_batch_and_dumps():
+    cntrs = rand_cntrs(100)
+    idx = cntr_index.CntrSimIndex()
+    idx.add_all(cntrs)
+    qs = rand_cntrs(6, seed=2)
+    ref = [idx.query(q, 3) for q in qs]
+    assert idx.query_batch(qs, 3, numprocs=2) == ref
+    idx2 = cntr_index.loads(cntr_index.dumps(idx))
+    assert [idx2.query(q, 3) for q in qs] == ref
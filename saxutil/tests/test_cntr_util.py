@@ -0,0 +1,40 @@
+import random
+from collections import Counter
+import numpy as np
+from scipy.spatial import distance
+from lib.saxutil import cntr_util
+
+
+def rand_cntrs(num, seed=0):
+    rng = random.Random(seed)
+    vocab = [str(i) for i in range(50)]
+    return [
+        Counter(rng.choices(vocab, k=rng.randint(1, 20))) for _ in range(num)
+    ]
+
+
+def test_cosine_dists_match_scipy():
+    refs, comps = rand_cntrs(4, seed=0), rand_cntrs(25, seed=1)
+    dists = cntr_util.cosine_dists(refs, comps, chunk_size=7)
+    objs = sorted(set().union(*(refs + comps)))
+    for i in range(len(refs)):
+        refvec = [refs[i][o] for o in objs]
+        for j in range(len(comps)):
+            compvec = [comps[j][o] for o in objs]
+            assert np.isclose(dists[i, j], distance.cosine(refvec, compvec))
+
+
+def test_convert_values_to_float_copies():
+    cntr = Counter({'a': 1, 'b': 2})
+    fcntr = cntr_util.convert_values_to_float(cntr)
+    assert fcntr == cntr
+    assert all([isinstance(v, float) for v in fcntr.values()])
+    assert all([isinstance(v, int) for v in cntr.values()])
+
+
+def test_csr_from_cntrs_idx_dtype():
+    cntrs = rand_cntrs(5)
+    for idx_dtype in (np.int32, np.int64,):
+        mtx, _ = cntr_util.csr_from_cntrs(cntrs, idx_dtype=idx_dtype)
+        assert mtx.indices.dtype == idx_dtype
+        assert mtx.indptr.dtype == idx_dtype
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import subprocess
+from lib.saxutil.txt_proc import corpus_cache, synonym, tkn_cache
+from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.txt_proc.PuncFilter import PuncFilter
+
+FLGSET = {'__NEG', '__Q', '__HYP', '__CMP', '__SUP'}
+DOCS = [
+    'New York is big__NEG .',
+    'the dogs ran to new york__Q in 1999',
+    'Stocks fell 12 % in New York__HYP',
+]
+
+
+def mk_mg():
+    mg = synonym.MatchGeneralizer()
+    mg.add(('new', 'york',), ('NYC',))
+    mg.add(('stocks', 'fell',), ('__DROP',))
+    mg.add(('dogs',), ('dog', 'animal',))
+    return mg
+
+
+def mk_pipe(mg=None):
+    stemr = tkn_transform.StemReplacer(flgset=FLGSET)
+    stemr.set_cache(tkn_cache.TknCache(maxsize=100))
+    mg = mk_mg() if mg is None else mg
+    return [
+        tkn_transform.MatchGeneralizeTransformer(mg),
+        tkn_transform.LowerCaseReplacer(FLGSET),
+        PuncFilter(FLGSET),
+        tkn_transform.NumberReplacer(FLGSET),
+        tkn_transform.StopWordFilter({'the', 'to', 'in', 'is'}, FLGSET),
+        stemr,
+    ]
+
+
+def fingerprint():
+    return corpus_cache.pipeline_fingerprint(mk_pipe(), str.split)
+
+
+def test_fingerprint_unchanged_by_run():
+    pipe = mk_pipe()
+    before = corpus_cache.pipeline_fingerprint(pipe, str.split)
+    with tempfile.TemporaryDirectory() as tmp:
+        cc = corpus_cache.CorpusCache(tmp, pipe, str.split)
+        tkn_lil = cc.run(DOCS)
+    assert corpus_cache.pipeline_fingerprint(pipe, str.split) == before
+    assert before == fingerprint()
+    assert tkn_lil == [
+        tkn_transform.run_pipeline(pipe, d.split())[0] for d in DOCS
+    ]
+
+
+def test_fingerprint_unchanged_by_compiling():
+    with tempfile.TemporaryDirectory() as tmp:
+        fpath = os.path.join(tmp, 'mg.bin')
+        synonym.write_compiled(mk_mg(), fpath, '')
+        mg = synonym.MatchGeneralizer.load_compiled(fpath)
+        assert corpus_cache.pipeline_fingerprint(
+            mk_pipe(mg), str.split
+        ) == fingerprint()
+        del mg
+
+
+def test_fingerprint_unchanged_by_hash_seed():
+    code = (
+        'from lib.saxutil.tests import test_corpus_cache as t\n'
+        'print(t.fingerprint())\n'
+    )
+    fps = set()
+    for seed in ('1', '2', '3'):
+        env = dict(os.environ)
+        env['PYTHONHASHSEED'] = seed
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        fps.add(out.decode('utf-8').strip())
+    assert fps == {fingerprint()}
@@ -0,0 +1,26 @@
+from lib.saxutil.txt_proc import tkn_transform, flg_tkns
+from lib.saxutil.tests.test_tkn_transform import FLGS, mk_pipes
+from lib.saxutil.bench import synth_corpus
+
+
+def test_flg_pipeline_matches_run_pipeline():
+    tkn_lil, tag_lil = synth_corpus.synth_docs(
+        50, mean_doclen=60, flag_density=.2, flgs=FLGS
+    )
+    for pipe in mk_pipes():
+        fp = flg_tkns.FlgPipeline(pipe, set(FLGS))
+        for tkns, tags in zip(tkn_lil, tag_lil):
+            assert fp.run(tkns, tags) == tkn_transform.run_pipeline(
+                pipe, tkns, tags
+            )
+
+
+def test_parse_join_round_trip():
+    fp = flg_tkns.FlgPipeline([], set(FLGS))
+    tkns = ['a__NEG', 'b', 'c__Q', 'd__NEG']
+    doc = fp.parse(tkns)
+    assert doc.rtkns == ['a', 'b', 'c', 'd']
+    assert [fp.flg_tbl.flgs[f] for f in doc.flg_ids] == [
+        '__NEG', '', '__Q', '__NEG'
+    ]
+    assert doc.join() == (tkns, [None] * 4)
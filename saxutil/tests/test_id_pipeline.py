@@ -0,0 +1,22 @@
+from lib.saxutil.txt_proc import tkn_transform, id_pipeline
+from lib.saxutil.tests.test_tkn_transform import FLGS, mk_pipes
+from lib.saxutil.bench import synth_corpus
+
+
+def test_id_pipeline_matches_run_pipeline():
+    tkn_lil, tag_lil = synth_corpus.synth_docs(
+        50, mean_doclen=60, flag_density=.2, flgs=FLGS
+    )
+    for pipe in mk_pipes():
+        ip = id_pipeline.IdPipeline(pipe)
+        for rnd in range(2):
+            # the second round reads every token from the filled tables
+            for tkns, tags in zip(tkn_lil, tag_lil):
+                assert ip.run(tkns, tags) == tkn_transform.run_pipeline(
+                    pipe, tkns, tags
+                )
+        ip.reset()
+        assert len(ip.vocab) == 0
+        assert ip.run(tkn_lil[0]) == tkn_transform.run_pipeline(
+            pipe, tkn_lil[0]
+        )
@@ -0,0 +1,49 @@
+from lib.saxutil import instrument
+from lib.saxutil.txt_proc import tkn_transform
+
+DOCS = [
+    ['The', 'cat', 'sat', 'on', 'the', 'mat'],
+    ['A', 'dog', 'and', 'the', 'cat'],
+]
+
+
+def mk_pipe():
+    return [
+        tkn_transform.LowerCaseReplacer(),
+        tkn_transform.StopWordFilter({'the', 'a', 'on', 'and'}),
+    ]
+
+
+def test_stage_counts_and_output():
+    pipe = mk_pipe()
+    ref = [tkn_transform.run_pipeline(pipe, tkns) for tkns in DOCS]
+    instrument.enable(profile_stage='run_pipeline.StopWordFilter')
+    try:
+        instrument.reset()
+        res = [tkn_transform.run_pipeline(pipe, tkns) for tkns in DOCS]
+        stats = instrument.to_dict()
+        prof = instrument.profile_stats()
+        prom = instrument.to_prometheus()
+    finally:
+        instrument.disable()
+        instrument.reset()
+    assert res == ref
+    numin = sum([len(tkns) for tkns in DOCS])
+    numout = sum([len(tkns) for tkns, tags in ref])
+    swf = stats['run_pipeline.StopWordFilter']
+    assert swf['calls'] == len(DOCS)
+    assert (swf['tkns_in'], swf['tkns_out'],) == (numin, numout,)
+    assert swf['tkns_dropped'] == numin - numout
+    assert stats['run_pipeline.LowerCaseReplacer']['tkns_dropped'] == 0
+    assert stats['run_pipeline']['tkns_out'] == numout
+    assert 'filt_run' in prof
+    assert (
+        'saxutil_stage_tokens_dropped_total'
+        '{stage="run_pipeline.StopWordFilter"} ' + str(numin - numout)
+    ) in prom
+
+
+def test_disabled_records_nothing():
+    instrument.reset()
+    tkn_transform.run_pipeline(mk_pipe(), DOCS[0])
+    assert instrument.to_dict() == {}
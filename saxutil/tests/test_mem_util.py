@@ -0,0 +1,45 @@
+import sys
+import tracemalloc
+import numpy as np
+from lib.saxutil import mem_util
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    arr = np.zeros(1000)
+    objs = [arr, arr.reshape(10, 100)]
+    assert mem_util.deep_sizeof(objs) >= arr.nbytes
+    assert mem_util.deep_sizeof(objs) < 2 * arr.nbytes
+    rep = mem_util.sizes_report([('a', arr), ('b', objs)])
+    assert rep['a'] >= arr.nbytes
+    assert rep['b'] < arr.nbytes
+    assert rep['total'] == rep['a'] + rep['b']
+    assert mem_util.deep_sizeof('abc') == sys.getsizeof('abc')
+
+
+def test_traced_peak_starts_and_stops_tracing():
+    assert not tracemalloc.is_tracing()
+    res, peak = mem_util.traced_peak(lambda n: bytearray(n), 10 ** 6)
+    assert len(res) == 10 ** 6
+    assert peak >= 10 ** 6
+    assert not tracemalloc.is_tracing()
+
+
+def test_traced_peak_keeps_outer_peak():
+    tracemalloc.start()
+    try:
+        big = bytearray(4 * 10 ** 6)
+        del big
+        outer_peak = tracemalloc.get_traced_memory()[1]
+        res, peak = mem_util.traced_peak(lambda n: len(bytearray(n)), 10 ** 5)
+        assert res == 10 ** 5
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= outer_peak
+        # the outer peak was higher, so this is the upper bound
+        assert peak >= 10 ** 5
+
+        res, peak = mem_util.traced_peak(
+            lambda n: len(bytearray(n)), 8 * 10 ** 6
+        )
+        assert 8 * 10 ** 6 <= peak < 9 * 10 ** 6
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,40 @@
+import random
+import numpy as np
+from sklearn.metrics import precision_score, recall_score, f1_score
+from lib.saxutil import metric_util
+
+
+def rand_lbls(num, seed=0):
+    rng = random.Random(seed)
+    tgts = [rng.choice('abcde') for _ in range(num)]
+    preds = [t if rng.random() < .6 else rng.choice('abcdf') for t in tgts]
+    return tgts, preds
+
+
+def test_confusion_accumulator_matches_sklearn():
+    tgts, preds = rand_lbls(500)
+    acc = metric_util.ConfusionAccumulator()
+    for beg in range(0, len(tgts), 120):
+        acc.update(tgts[beg:beg + 120], preds[beg:beg + 120])
+    lbls, metric_on_name = acc.metrics()
+    assert lbls == sorted(set(tgts) | set(preds))
+    for name, func in [
+        ('precision', precision_score,), ('recall', recall_score,),
+        ('f1', f1_score,),
+    ]:
+        ref = func(tgts, preds, labels=lbls, average=None, zero_division=0)
+        assert np.allclose(metric_on_name[name], ref)
+    assert metric_on_name['support'].tolist() == [
+        tgts.count(l) for l in lbls
+    ]
+
+
+def test_confusion_accumulator_keeps_label_types():
+    acc = metric_util.ConfusionAccumulator()
+    acc.update([1, '1', None, 1], ['1', '1', None, 1])
+    lbls, cmtx = acc.sorted_confusion()
+    assert lbls == [None, 1, '1']
+    assert cmtx.tolist() == [[1, 0, 0], [0, 1, 1], [0, 0, 1]]
+    md = acc.lbl_metric_dict()
+    assert set(md) == {None, 1, '1'}
+    assert md[1][1] == 2
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import numpy as np
+from scipy import sparse
+from lib.saxutil import mtx_store
+
+
+def test_load_mtx_keeps_memmaps():
+    mtx = sparse.random(50, 40, density=.1, format='csr', random_state=0)
+    mtx.indices = mtx.indices.astype(np.int64)
+    mtx.indptr = mtx.indptr.astype(np.int64)
+    with tempfile.TemporaryDirectory() as tmp:
+        dirpath = os.path.join(tmp, 'mtx')
+        mtx_store.save_mtx(mtx, dirpath)
+        loaded = mtx_store.load_mtx(dirpath)
+        for name in mtx_store.ARR_NAMES:
+            assert isinstance(getattr(loaded, name), np.memmap), name
+        assert loaded.indices.dtype == np.int64
+        assert (loaded != mtx).nnz == 0
+        del loaded
+
+
+def test_save_mtx_leaves_caller_unsorted():
+    mtx = sparse.csr_matrix(
+        (np.array([1.0, 2.0]), np.array([3, 1]), np.array([0, 2])),
+        shape=(1, 4)
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        mtx_store.save_mtx(mtx, os.path.join(tmp, 'mtx'))
+        loaded = mtx_store.load_mtx(os.path.join(tmp, 'mtx'))
+        assert loaded.indices.tolist() == [1, 3]
+        del loaded
+    assert mtx.indices.tolist() == [3, 1]
+
+
+def test_append_rows_after_unfinished_append():
+    mtx = sparse.random(20, 10, density=.3, format='csr', random_state=1)
+    block = sparse.random(5, 10, density=.3, format='csr', random_state=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        dirpath = os.path.join(tmp, 'mtx')
+        mtx_store.save_mtx(mtx, dirpath)
+        # the arrays of an append that stopped before its header was written
+        for name in mtx_store.ARR_NAMES:
+            with open(os.path.join(dirpath, name + '.bin'), 'ab') as f:
+                f.write(b'\x01' * 24)
+        loaded = mtx_store.load_mtx(dirpath)
+        assert (loaded != mtx).nnz == 0
+        del loaded
+        mtx_store.append_rows(dirpath, block)
+        loaded = mtx_store.load_mtx(dirpath)
+        assert (loaded != sparse.vstack([mtx, block])).nnz == 0
+        del loaded
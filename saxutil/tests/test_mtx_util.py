@@ -0,0 +1,46 @@
+import numpy as np
+from scipy import sparse
+from lib.saxutil import mtx_util
+
+
+def test_csr_from_flat_cols_leaves_inputs_unchanged():
+    cols = np.array([2, 0, 2, 1, 1], dtype=np.int32)
+    offsets = np.array([0, 3, 5], dtype=np.int32)
+    mtx = mtx_util.csr_from_flat_cols(cols, offsets, idx_dtype=np.int32)
+    assert cols.tolist() == [2, 0, 2, 1, 1]
+    assert offsets.tolist() == [0, 3, 5]
+    assert mtx.toarray().tolist() == [[1.0, 0.0, 2.0], [0.0, 2.0, 0.0]]
+
+
+def rand_mtx(seed=0):
+    mtx = sparse.random(
+        230, 40, density=.1, format='csr', random_state=seed
+    )
+    # a row with no values has a nan similarity
+    mtx.data[mtx.indptr[5]:mtx.indptr[6]] = 0.0
+    mtx.eliminate_zeros()
+    return mtx
+
+
+def test_chunked_resultant_cosine_sims():
+    mtx = rand_mtx()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref = mtx_util.resultant_cosine_sims(mtx)
+    for numprocs in (1, 2,):
+        sims = mtx_util.chunked_resultant_cosine_sims(
+            mtx, numprocs=numprocs, block_size=50
+        )
+        assert np.allclose(sims, ref, equal_nan=True)
+
+
+def test_extreme_central_rows():
+    mtx = rand_mtx()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref = mtx_util.resultant_cosine_sims(mtx)
+    order = [int(i) for i in np.argsort(ref) if not np.isnan(ref[i])]
+    top, bot = mtx_util.extreme_central_rows(
+        mtx, topk=5, bottomk=3, block_size=50
+    )
+    assert [r for r, s in top] == order[::-1][:5]
+    assert [r for r, s in bot] == order[:3]
+    assert np.allclose([s for r, s in top], ref[order[::-1][:5]])
@@ -0,0 +1,47 @@
+import random
+from lib.saxutil import pair_range_util as pru
+
+
+def rand_bnds(num, seed=0):
+    rng = random.Random(seed)
+    bnds = []
+    for _ in range(num):
+        b = rng.randint(0, 100)
+        bnds.append((b, b + rng.randint(0, 12),))
+    return bnds
+
+
+def test_subsumed_bound_indices_matches_pairwise():
+    for seed in range(5):
+        bnds = rand_bnds(150, seed)
+        ref = set([
+            i for i in range(len(bnds)) for j in range(len(bnds))
+            if i != j and pru.is_subsumed(*(bnds[i] + bnds[j]))
+        ])
+        assert pru.subsumed_bound_indices(bnds) == ref
+
+
+def test_range_index_matches_brute_force():
+    bnds, qbnds = rand_bnds(200, 1), rand_bnds(50, 2)
+    ri = pru.RangeIndex(bnds)
+    overlapping = ri.overlapping(qbnds)
+    containing = ri.containing(qbnds)
+    contained_in = ri.contained_in(qbnds)
+    counts = ri.overlap_counts(qbnds)
+    for q in range(len(qbnds)):
+        qb, qe = qbnds[q]
+        ref = [
+            i for i in range(len(bnds))
+            if pru.do_ranges_overlap(qb, qe, *bnds[i]) or
+            pru.do_ranges_overlap(*(bnds[i] + (qb, qe,)))
+        ]
+        assert overlapping[q] == ref
+        assert counts[q] == len(ref)
+        assert containing[q] == [
+            i for i in range(len(bnds))
+            if bnds[i][0] <= qb and qe <= bnds[i][1]
+        ]
+        assert contained_in[q] == [
+            i for i in range(len(bnds))
+            if qb <= bnds[i][0] and bnds[i][1] <= qe
+        ]
@@ -0,0 +1,31 @@
+import random
+from lib.saxutil.txt_proc import tkn_transform, par_pipeline
+from lib.saxutil.tests.test_tkn_transform import FLGS, mk_pipes
+from lib.saxutil.bench import synth_corpus
+
+
+def test_iter_pipeline_par_keeps_input_order():
+    tkn_lil, tag_lil = synth_corpus.synth_docs(
+        120, mean_doclen=40, flag_density=.2, flgs=FLGS
+    )
+    # documents of very different lengths, so chunks finish out of order
+    rng = random.Random(0)
+    tkn_lil = [tkns[:rng.randint(0, len(tkns))] for tkns in tkn_lil]
+    tag_lil = [tag_lil[i][:len(tkn_lil[i])] for i in range(len(tkn_lil))]
+    pipe = mk_pipes()[0]
+    ref = [
+        tkn_transform.run_pipeline(pipe, tkns, tags)
+        for tkns, tags in zip(tkn_lil, tag_lil)
+    ]
+    for start_method in ('fork', 'spawn',):
+        res = list(par_pipeline.iter_pipeline_par(
+            pipe, zip(tkn_lil, tag_lil), numprocs=3, chunk_tkns=50,
+            start_method=start_method
+        ))
+        assert res == ref
+
+
+def test_chunk_docs():
+    docs = [['a'] * n for n in (3, 4, 1, 9, 2, 2)]
+    chunks = list(par_pipeline.chunk_docs(docs, chunk_tkns=5))
+    assert [[len(d) for d in c] for c in chunks] == [[3, 4], [1, 9], [2, 2]]
@@ -0,0 +1,59 @@
+import random
+from lib.saxutil.txt_proc import synonym
+
+VOCAB = ['a', 'b', 'c', 'd']
+
+
+def rand_mg(seed=0):
+    rng = random.Random(seed)
+    mg = synonym.MatchGeneralizer(case_sensitive=True)
+    while len(mg.to_ngram_on_from_ngram) < 15:
+        ngram = tuple(rng.choices(VOCAB, k=rng.randint(1, 4)))
+        if ngram not in mg.to_ngram_on_from_ngram:
+            mg.add(ngram, ('X' + str(len(mg.to_ngram_on_from_ngram)),))
+    return mg
+
+
+def brute_matches(mg, tkns):
+    return [
+        (beg, beg + len(ngram) - 1,)
+        for ngram in mg.to_ngram_on_from_ngram
+        for beg in range(len(tkns) - len(ngram) + 1)
+        if tuple(tkns[beg:beg + len(ngram)]) == ngram
+    ]
+
+
+def test_iter_matches_finds_every_occurrence():
+    rng = random.Random(1)
+    for seed in range(5):
+        mg = rand_mg(seed)
+        for _ in range(20):
+            tkns = rng.choices(VOCAB, k=rng.randint(0, 30))
+            assert sorted(mg.automaton.iter_matches(tkns)) == sorted(
+                brute_matches(mg, tkns)
+            )
+
+
+def test_match_bounds_keeps_longest_leftmost():
+    rng = random.Random(2)
+    for seed in range(5):
+        mg = rand_mg(seed)
+        for _ in range(20):
+            tkns = rng.choices(VOCAB, k=rng.randint(0, 30))
+            ref = []
+            for beg, end in sorted(
+                brute_matches(mg, tkns), key=lambda b: (b[0] - b[1], b[0],)
+            ):
+                if all([e < beg or end < b for b, e in ref]):
+                    ref.append((beg, end,))
+            assert mg.match_bounds(tkns) == sorted(ref)
+
+
+def test_run_replaces_matches():
+    mg = synonym.MatchGeneralizer()
+    mg.add(('new', 'york',), ('nyc',))
+    mg.add(('new', 'york', 'city',), ('nyc',))
+    mg.add(('york',), ('yk',))
+    assert mg.run(['in', 'new', 'york', 'city', 'or', 'york']) == (
+        ['in', 'nyc', 'or', 'yk'], [None] * 4
+    )
@@ -0,0 +1,30 @@
+import pytest
+from lib.saxutil.txt_proc import tkn_transform, tkn_cache
+from lib.saxutil.txt_proc.PuncFilter import PuncFilter, AbbrvFilter
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        tkn_cache.TknCache(maxsize=0)
+
+
+def test_set_cache_without_tkn_processor():
+    for cls in (PuncFilter, AbbrvFilter,):
+        tr = cls()
+        with pytest.raises(TypeError):
+            tr.set_cache(tkn_cache.TknCache())
+        assert tr.cache is None
+        assert tr.run(['a', ',', 'U.S.']) == cls().run(['a', ',', 'U.S.'])
+
+
+def test_cache_belongs_to_one_transformer():
+    cache = tkn_cache.TknCache()
+    lcr = tkn_transform.LowerCaseReplacer()
+    lcr.set_cache(cache)
+    nr = tkn_transform.NumberReplacer()
+    with pytest.raises(ValueError):
+        nr.set_cache(cache)
+    lcr.clear_cache()
+    nr.set_cache(cache)
+    assert nr.run(['Dogs', '12'])[0] == nr.run(['Dogs', '12'])[0]
+    assert cache.owner is nr
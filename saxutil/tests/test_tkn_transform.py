@@ -0,0 +1,49 @@
+from lib.saxutil.txt_proc import tkn_transform, synonym
+from lib.saxutil.txt_proc.PuncFilter import PuncFilter, AbbrvFilter
+from lib.saxutil.bench import synth_corpus
+
+FLGS = ('__NEG', '__Q',)
+STOPWORDS = {'the', 'a', 'of', 'and'}
+
+
+def mk_pipes():
+    flgset = set(FLGS)
+    twp = tkn_transform.TermWithPosReplacer(flgset)
+    twp.add_tkn_pos_transform('the', 'DT', 'THE')
+    mg = synonym.MatchGeneralizer()
+    mg.add(('1', ',',), ('__one',))
+    return [
+        [
+            tkn_transform.LowerCaseReplacer(flgset),
+            tkn_transform.NumberReplacer(flgset),
+            tkn_transform.StopWordFilter(STOPWORDS, flgset),
+            tkn_transform.NumberFilter(flgset),
+            tkn_transform.StemReplacer(flgset=flgset),
+        ],
+        [
+            PuncFilter(flgset),
+            twp,
+            tkn_transform.MatchGeneralizeTransformer(mg),
+            AbbrvFilter(flgset),
+            tkn_transform.LowerCaseReplacer(flgset),
+            tkn_transform.NumberReplacer(flgset, replace_with='__NUM'),
+        ],
+        # flags split different ways cannot share one split
+        [
+            tkn_transform.LowerCaseReplacer({'__NEG'}),
+            tkn_transform.StopWordFilter(STOPWORDS, flgset),
+            PuncFilter(),
+        ],
+    ]
+
+
+def test_compile_pipeline_matches_run_pipeline():
+    tkn_lil, tag_lil = synth_corpus.synth_docs(
+        50, mean_doclen=60, flag_density=.2, flgs=FLGS
+    )
+    for pipe in mk_pipes():
+        fused = tkn_transform.compile_pipeline(pipe)
+        for tkns, tags in zip(tkn_lil, tag_lil):
+            assert fused.run(tkns, tags) == tkn_transform.run_pipeline(
+                pipe, tkns, tags
+            )
@@ -0,0 +1,54 @@
+import copy
+import json
+from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.bench import synth_corpus, txt_proc_bench
+
+
+def test_run_covers_every_stage():
+    res = txt_proc_bench.run(numdocs=10, measure_mem=False)
+    tkn_lil, tag_lil = synth_corpus.synth_docs(10, seed=0)
+    assert res['meta']['numdocs'] == 10
+    assert res['meta']['numtkns'] == sum([len(d) for d in tkn_lil])
+    names = [n for n, tr in txt_proc_bench.mk_transformers(tkn_lil)]
+    assert sorted(res['results']) == sorted(names + ['run_pipeline'])
+    for name, r in res['results'].items():
+        # LemmaReplacer is skipped when WordNet is not installed
+        if 'skipped' in r:
+            assert name == 'LemmaReplacer'
+            continue
+        assert r['tkns_per_sec'] > 0
+        assert 'peak_bytes' not in r
+
+
+def test_match_generalizer_ngrams_occur_in_corpus():
+    tkn_lil, tag_lil = synth_corpus.synth_docs(10, seed=0)
+    mgt = tkn_transform.MatchGeneralizeTransformer(
+        txt_proc_bench.mk_match_generalizer(tkn_lil, numngrams=50)
+    )
+    outs = [mgt.run(tkn_lil[i], tag_lil[i])[0] for i in range(len(tkn_lil))]
+    assert any(t.startswith('__ngram') for tkns in outs for t in tkns)
+
+
+def test_compare_detects_regressions(tmp_path):
+    res = txt_proc_bench.run(numdocs=5)
+    assert txt_proc_bench.compare(res, res) == []
+
+    faster = copy.deepcopy(res)
+    faster['results']['run_pipeline']['tkns_per_sec'] *= 2
+    faster['results']['StopWordFilter']['peak_bytes'] //= 2
+    regressions = txt_proc_bench.compare(res, faster)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('StopWordFilter: peak bytes')
+    assert regressions[1].startswith('run_pipeline: tokens/sec')
+
+    path = tmp_path / 'baseline.json'
+    faster['results'] = {
+        n: {'tkns_per_sec': 1e12, 'secs': 0.0}
+        for n in faster['results']
+    }
+    path.write_text(json.dumps(faster))
+    argv = ['--numdocs', '5', '--no-mem', '--baseline', str(path)]
+    assert txt_proc_bench.main(argv) == 1
+    out = tmp_path / 'out.json'
+    assert txt_proc_bench.main(['--numdocs', '5', '--out', str(out)]) == 0
+    assert json.loads(out.read_text())['meta']['numdocs'] == 5
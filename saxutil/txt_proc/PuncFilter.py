@@ -6,7 +6,7 @@
 #$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$#
 #$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$#    
 
-import tkn_transform
+from lib.saxutil.txt_proc import tkn_transform
 
 #$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$#
 #$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$$#
@@ -75,6 +75,9 @@ class PuncFilter(tkn_transform.TransformBase):
     ###############################################################################################
     ###############################################################################################    
 
+    # the rejection methods ignore the tag
+    uses_tags = False
+
     #------------------------------------------------------------------------------------------------------------------------------------------------------#
     # initialize / constructor
     #------------------------------------------------------------------------------------------------------------------------------------------------------#    
@@ -92,6 +95,12 @@ class PuncFilter(tkn_transform.TransformBase):
     def _reject_tkn(self, tkn, tag=None):
         # split token from flag / tag
         rtkn, flg = self.flg_splitr.split(tkn)
+        return self._reject_split_tkn(rtkn, flg, tag)
+
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#
+    # method to evaluate token rejection based on punctuation for a token already split from its flag
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#        
+    def _reject_split_tkn(self, rtkn, flg, tag=None):
         punctuation_bools = set()
         
         # create boolean set for each character in token
@@ -110,6 +119,16 @@ class PuncFilter(tkn_transform.TransformBase):
     def run(self, tkns, tags=None):
         return tkn_transform.filt_run(self._reject_tkn, tkns, tags)
 
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#
+    # methods to describe this filter to the global method compile_pipeline()
+    # return the stage type "filter" and the rejection methods _reject_tkn() / _reject_split_tkn()
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#    
+    def tkn_stage(self):
+        return 'filter', self._reject_tkn
+
+    def split_tkn_stage(self):
+        return 'filter', self._reject_split_tkn
+
 class AbbrvFilter(tkn_transform.TransformBase):
     ###############################################################################################
     ###############################################################################################
@@ -151,6 +170,9 @@ class AbbrvFilter(tkn_transform.TransformBase):
     ###############################################################################################
     ###############################################################################################    
 
+    # the rejection methods ignore the tag
+    uses_tags = False
+
     #------------------------------------------------------------------------------------------------------------------------------------------------------#
     # initialize / constructor
     #------------------------------------------------------------------------------------------------------------------------------------------------------#    
@@ -167,7 +189,12 @@ class AbbrvFilter(tkn_transform.TransformBase):
     def _reject_abbrv(self, tkn, tag=None):
         # split token from flag / tag
         rtkn, flg = self.flg_splitr.split(tkn)
+        return self._reject_split_abbrv(rtkn, flg, tag)
 
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#
+    # method to evaluate token rejection based on abbreviations for a token already split from its flag
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#        
+    def _reject_split_abbrv(self, rtkn, flg, tag=None):
         # test if token is the abbreviation set
         if rtkn in self.abbrevations:
             return True
@@ -178,4 +205,14 @@ class AbbrvFilter(tkn_transform.TransformBase):
     # filt_run() is a global method
     #------------------------------------------------------------------------------------------------------------------------------------------------------#    
     def run(self, tkns, tags=None):
-        return tkn_transform.filt_run(self._reject_abbrv, tkns, tags)
\ No newline at end of file
+        return tkn_transform.filt_run(self._reject_abbrv, tkns, tags)
+
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#
+    # methods to describe this filter to the global method compile_pipeline()
+    # return the stage type "filter" and the rejection methods _reject_abbrv() / _reject_split_abbrv()
+    #------------------------------------------------------------------------------------------------------------------------------------------------------#    
+    def tkn_stage(self):
+        return 'filter', self._reject_abbrv
+
+    def split_tkn_stage(self):
+        return 'filter', self._reject_split_abbrv
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+On-disk cache of tokenized and transformed documents. Entries are keyed by
+a hash of the raw document text, under a directory named after a
+fingerprint of the tokenizer and pipeline configuration. Changing any
+transformer setting gives a new fingerprint, so stale entries are never
+read. "prune" deletes them.
+
+The fingerprint covers only what a transformer is constructed with: its
+class, its settings, the sorted flags of its FlagSplitter and the sorted
+entries of a MatchGeneralizer dictionary. Caches and state built lazily
+from those settings, such as a dictionary's matching automaton, are left
+out, so running a pipeline or loading it in another process does not
+change its fingerprint.
+
+Documents are written in segments. A segment is a set of flat arrays: the
+16 byte keys, int64 offsets and int32 token ids of its documents, plus a
+json list of the tokens the ids refer to.
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import numpy as np
+from lib.saxutil.txt_proc import tkn_transform
+from lib.saxutil.txt_proc import synonym
+
+FORMAT_VERSION = 1
+KEY_SIZE = 16
+SEG_EXTS = ('offsets', 'ids', 'vocab', 'keys',)
+# transformer attributes that cache results rather than configure them
+SKIP_ATTRS = {'cache', 'tkn_processor', 'split_tkn_processor'}
+
+
+def doc_key(doc):
+    """
+    :type doc: str
+    :rtype: bytes
+    """
+    return hashlib.sha256(doc.encode('utf-8')).digest()[:KEY_SIZE]
+
+
+def _canon(obj, seen):
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes,)):
+        return repr(obj)
+    if callable(obj) and hasattr(obj, '__qualname__'):
+        # classes and functions are named, not walked
+        owner = getattr(obj, '__self__', None)
+        name = (getattr(obj, '__module__', None) or '') + '.' + (
+            obj.__qualname__
+        )
+        if owner is not None and not isinstance(owner, type):
+            # a bound method depends on its instance
+            return name + '(' + _canon(owner, seen) + ')'
+        return name
+    if id(obj) in seen:
+        return '<cycle>'
+    seen = seen | {id(obj)}
+    if isinstance(obj, re.Pattern):
+        return 're(' + repr(obj.pattern) + ',' + str(obj.flags) + ')'
+    if isinstance(obj, np.ndarray):
+        return 'ndarray(' + obj.dtype.str + ',' + str(obj.shape) + ',' + (
+            hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()
+        ) + ')'
+    if isinstance(obj, (list, tuple,)):
+        return (
+            type(obj).__name__ + '[' +
+            ','.join([_canon(o, seen) for o in obj]) + ']'
+        )
+    if isinstance(obj, (set, frozenset,)):
+        return 'set[' + ','.join(sorted([_canon(o, seen) for o in obj])) + ']'
+    if isinstance(obj, dict):
+        return '{' + ','.join(sorted([
+            _canon(k, seen) + ':' + _canon(v, seen) for k, v in obj.items()
+        ])) + '}'
+    cls = type(obj)
+    name = cls.__module__ + '.' + cls.__qualname__
+    if isinstance(obj, tkn_transform.FlagSplitter):
+        return name + _canon(obj.flgs, seen)
+    if isinstance(obj, synonym.MatchGeneralizer):
+        # the dictionary, not the automaton built from it, which is also
+        # what a compiled MatchGeneralizer holds
+        return name + _canon([
+            obj.case_sensitive, obj.postag_method,
+            sorted(obj.to_ngram_on_from_ngram.items()),
+        ], seen)
+    if not hasattr(obj, '__dict__'):
+        return name
+    attrs = {
+        k: v for k, v in obj.__dict__.items() if k not in SKIP_ATTRS
+    }
+    return name + _canon(attrs, seen)
+
+
+def pipeline_fingerprint(transformers, tokenize_method=None):
+    """
+    Hash of the classes and settings of a tokenizer and pipeline. Two
+    pipelines built the same way have the same fingerprint in any process.
+
+    :type transformers: list<obj>
+    :type tokenize_method: function
+    :rtype: str
+    """
+    dta = _canon(
+        [FORMAT_VERSION, tokenize_method, list(transformers)], frozenset()
+    )
+    return hashlib.sha256(dta.encode('utf-8')).hexdigest()[:32]
+
+
+class CorpusCache(object):
+    """
+    EXAMPLE
+    -------
+    cc = CorpusCache('/data/tkn_cache', pipe, nltk.word_tokenize)
+    tkn_lil = cc.run(docs)
+    # a second run with the same documents and pipeline reads every
+    # document from disk
+    -------
+    """
+    def __init__(self, dirpath, transformers, tokenize_method):
+        """
+        :type dirpath: str
+        :param dirpath: shared by any number of pipelines
+        :type transformers: list<obj>
+        :type tokenize_method: function
+        """
+        self.dirpath = dirpath
+        self.transformers = list(transformers)
+        self.tokenize_method = tokenize_method
+        self.fingerprint = pipeline_fingerprint(
+            self.transformers, tokenize_method
+        )
+        self.pipe_dirpath = os.path.join(dirpath, self.fingerprint)
+        if not os.path.exists(self.pipe_dirpath):
+            os.makedirs(self.pipe_dirpath)
+        self.loc_on_key = {}
+        self.segs = {}
+        for fname in sorted(os.listdir(self.pipe_dirpath)):
+            if fname.endswith('.keys'):
+                self._index_seg(fname[:-len('.keys')])
+
+    def _seg_path(self, seg, ext):
+        return os.path.join(self.pipe_dirpath, seg + '.' + ext)
+
+    def _index_seg(self, seg):
+        keys = np.fromfile(self._seg_path(seg, 'keys'), dtype=np.uint8)
+        keys = keys.reshape(-1, KEY_SIZE)
+        for row in range(len(keys)):
+            self.loc_on_key[keys[row].tobytes()] = (seg, row,)
+
+    def _load_seg(self, seg):
+        arrs = self.segs.get(seg)
+        if arrs is None:
+            with open(self._seg_path(seg, 'vocab')) as f:
+                vocab = json.loads(f.read())
+            arrs = self.segs[seg] = (
+                np.fromfile(self._seg_path(seg, 'offsets'), dtype=np.int64),
+                np.fromfile(self._seg_path(seg, 'ids'), dtype=np.int32),
+                vocab,
+            )
+        return arrs
+
+    def __len__(self):
+        return len(self.loc_on_key)
+
+    def __contains__(self, doc):
+        return doc_key(doc) in self.loc_on_key
+
+    def get(self, doc):
+        """
+        :type doc: str
+        :rtype: list<str>
+        :returns: the transformed tokens, or None if "doc" is not cached
+        """
+        loc = self.loc_on_key.get(doc_key(doc))
+        if loc is None:
+            return None
+        offsets, ids, vocab = self._load_seg(loc[0])
+        row = loc[1]
+        return [vocab[i] for i in ids[offsets[row]:offsets[row + 1]].tolist()]
+
+    def put_many(self, docs, tkn_lil):
+        """
+        Write the transformed tokens of documents as a new segment.
+        Documents already cached are skipped.
+
+        :type docs: list<str>
+        :type tkn_lil: list<list<str>>
+        """
+        if len(docs) != len(tkn_lil):
+            raise ValueError('len(docs) != len(tkn_lil)')
+        keys, rows = [], []
+        seen = set()
+        for i in range(len(docs)):
+            key = doc_key(docs[i])
+            if key in self.loc_on_key or key in seen:
+                continue
+            seen.add(key)
+            keys.append(key)
+            rows.append(i)
+        if len(keys) == 0:
+            return
+
+        id_on_tkn, vocab = {}, []
+        ids, offsets = [], [0]
+        for i in rows:
+            for tkn in tkn_lil[i]:
+                tid = id_on_tkn.get(tkn)
+                if tid is None:
+                    tid = id_on_tkn[tkn] = len(vocab)
+                    vocab.append(tkn)
+                ids.append(tid)
+            offsets.append(len(ids))
+
+        seg = hashlib.sha256(b''.join(keys)).hexdigest()[:16]
+        # the keys file is written last, so a segment is only indexed once
+        # all of its files are complete
+        arr_on_ext = {
+            'offsets': np.array(offsets, dtype=np.int64),
+            'ids': np.array(ids, dtype=np.int32),
+            'keys': np.frombuffer(b''.join(keys), dtype=np.uint8),
+        }
+        for ext in SEG_EXTS:
+            tmp_path = self._seg_path(seg, ext) + '.tmp'
+            if ext == 'vocab':
+                with open(tmp_path, 'w') as f:
+                    f.write(json.dumps(vocab))
+            else:
+                arr_on_ext[ext].tofile(tmp_path)
+            os.replace(tmp_path, self._seg_path(seg, ext))
+        self._index_seg(seg)
+
+    def run(self, docs):
+        """
+        Tokenize and transform documents, reading those already cached
+        from disk and caching the rest.
+
+        :type docs: list<str>
+        :rtype: list<list<str>>
+        """
+        tkn_lil = [self.get(d) for d in docs]
+        miss_ixs = [i for i in range(len(docs)) if tkn_lil[i] is None]
+        for i in miss_ixs:
+            tkn_lil[i] = tkn_transform.run_pipeline(
+                self.transformers, self.tokenize_method(docs[i])
+            )[0]
+        self.put_many(
+            [docs[i] for i in miss_ixs], [tkn_lil[i] for i in miss_ixs]
+        )
+        return tkn_lil
+
+    def prune(self):
+        """
+        Delete the entries of every other pipeline fingerprint under
+        "dirpath".
+
+        :rtype: list<str>
+        :returns: the deleted fingerprints
+        """
+        pruned = []
+        for fname in os.listdir(self.dirpath):
+            fpath = os.path.join(self.dirpath, fname)
+            if fname != self.fingerprint and os.path.isdir(fpath):
+                shutil.rmtree(fpath)
+                pruned.append(fname)
+        return pruned
@@ -0,0 +1,193 @@
+"""
+Documents held with each token's flag, such as "__NEG", kept apart from
+the token. A FlgDoc stores parallel lists of base tokens, flag ids and
+tags. Flags are split off once when a document is parsed and put back once
+when it is joined, instead of by every transformer in a pipeline.
+"""
+from lib.saxutil.txt_proc import tkn_transform
+
+
+class FlgTable(object):
+    """
+    Maps flags to small integer ids. The empty flag, for tokens without
+    one, is always id 0.
+    """
+    def __init__(self):
+        self.flgs = ['']
+        self.id_on_flg = {'': 0}
+
+    def get_id_add_on_absent(self, flg):
+        """
+        :type flg: str
+        :rtype: int
+        """
+        i = self.id_on_flg.get(flg)
+        if i is None:
+            i = len(self.flgs)
+            self.id_on_flg[flg] = i
+            self.flgs.append(flg)
+        return i
+
+
+class FlgDoc(object):
+    def __init__(self, rtkns, flg_ids, tags, flg_tbl):
+        """
+        :type rtkns: list<str>
+        :param rtkns: tokens without their flags
+        :type flg_ids: list<int>
+        :type tags: list<str>
+        :type flg_tbl: FlgTable
+        """
+        if not len(rtkns) == len(flg_ids) == len(tags):
+            raise ValueError('len(rtkns), len(flg_ids), len(tags) differ')
+        self.rtkns = rtkns
+        self.flg_ids = flg_ids
+        self.tags = tags
+        self.flg_tbl = flg_tbl
+
+    def __len__(self):
+        return len(self.rtkns)
+
+    def join(self):
+        """
+        :rtype: tuple(list<str>, list<str>,)
+        :returns: tokens with their flags attached again, and tags
+        """
+        flgs = self.flg_tbl.flgs
+        return (
+            [r + flgs[f] for r, f in zip(self.rtkns, self.flg_ids)],
+            list(self.tags)
+        )
+
+
+def parse_doc(flg_splitr, flg_tbl, tkns, tags=None):
+    """
+    :type flg_splitr: tkn_transform.FlagSplitter
+    :type flg_tbl: FlgTable
+    :type tkns: list<str>
+    :type tags: list<str>
+    :rtype: FlgDoc
+    """
+    if tags is None:
+        tags = [None] * len(tkns)
+    split = flg_splitr.split
+    get_id = flg_tbl.get_id_add_on_absent
+    rtkns = [None] * len(tkns)
+    flg_ids = [0] * len(tkns)
+    for i in range(len(tkns)):
+        rtkn, flg = split(tkns[i])
+        rtkns[i] = rtkn
+        if flg != '':
+            flg_ids[i] = get_id(flg)
+    return FlgDoc(rtkns, flg_ids, list(tags), flg_tbl)
+
+
+class FlgAdapter(object):
+    """
+    Runs an existing transformer over a FlgDoc. Transformers that split
+    flags with the same pattern as the document and have a split_tkn_stage
+    work on the base tokens and flags directly. Any other transformer, such
+    as MatchGeneralizeTransformer, is run on the joined tokens and its
+    output is parsed again.
+    """
+    def __init__(self, tr, flg_splitr):
+        """
+        :type tr: obj
+        :type flg_splitr: tkn_transform.FlagSplitter
+        :param flg_splitr: splitter the documents were parsed with
+        """
+        self.tr = tr
+        self.flg_splitr = flg_splitr
+        self.stage = None
+        if (
+            hasattr(tr, 'flg_splitr') and hasattr(tr, 'split_tkn_stage') and
+            tr.flg_splitr.patt.pattern == flg_splitr.patt.pattern
+        ):
+            self.stage = tr.split_tkn_stage()
+
+    def run(self, doc):
+        """
+        :type doc: FlgDoc
+        :rtype: FlgDoc
+        """
+        if self.stage is None:
+            tkns, tags = self.tr.run(*doc.join())
+            return parse_doc(self.flg_splitr, doc.flg_tbl, tkns, tags)
+        kind, func = self.stage
+        flgs = doc.flg_tbl.flgs
+        if kind == 'filter':
+            keep = [
+                i for i in range(len(doc))
+                if not func(doc.rtkns[i], flgs[doc.flg_ids[i]], doc.tags[i])
+            ]
+            return FlgDoc(
+                [doc.rtkns[i] for i in keep], [doc.flg_ids[i] for i in keep],
+                [doc.tags[i] for i in keep], doc.flg_tbl
+            )
+        get_id = doc.flg_tbl.id_on_flg.get
+        add = doc.flg_tbl.get_id_add_on_absent
+        rtkns = [None] * len(doc)
+        flg_ids = [0] * len(doc)
+        tags = [None] * len(doc)
+        for i in range(len(doc)):
+            rtkn, flg, tag = func(
+                doc.rtkns[i], flgs[doc.flg_ids[i]], doc.tags[i]
+            )
+            fid = get_id(flg)
+            rtkns[i], flg_ids[i], tags[i] = (
+                rtkn, add(flg) if fid is None else fid, tag
+            )
+        return FlgDoc(rtkns, flg_ids, tags, doc.flg_tbl)
+
+
+class FlgPipeline(object):
+    """
+    A pipeline over FlgDocs. "run" takes and returns plain token and tag
+    lists like run_pipeline, and gives the same output, but the flags are
+    split off on the way in and attached on the way out only. Use
+    "parse" / "run_doc" / FlgDoc.join to keep documents split between
+    pipelines.
+
+    EXAMPLE
+    -------
+    trs = [LowerCaseReplacer(flgs), StemReplacer(flgset=flgs)]
+    fp = FlgPipeline(trs, flgs)
+    fp.run(['Dogs__NEG', 'ran'])
+    # -> (['dog__NEG', 'ran'], [None, None])
+    -------
+    """
+    def __init__(self, transformers, flgset):
+        """
+        :type transformers: list<obj>
+        :type flgset: set<str>
+        """
+        self.flg_splitr = tkn_transform.FlagSplitter(flgset)
+        self.flg_tbl = FlgTable()
+        self.adapters = [
+            FlgAdapter(tr, self.flg_splitr) for tr in transformers
+        ]
+
+    def parse(self, tkns, tags=None):
+        """
+        :type tkns: list<str>
+        :type tags: list<str>
+        :rtype: FlgDoc
+        """
+        return parse_doc(self.flg_splitr, self.flg_tbl, tkns, tags)
+
+    def run_doc(self, doc):
+        """
+        :type doc: FlgDoc
+        :rtype: FlgDoc
+        """
+        for adp in self.adapters:
+            doc = adp.run(doc)
+        return doc
+
+    def run(self, tkns, tags=None):
+        """
+        :type tkns: list<str>
+        :type tags: list<str>
+        :rtype: tuple(list<str>, list<str>,)
+        """
+        return self.run_doc(self.parse(tkns, tags)).join()
@@ -0,0 +1,207 @@
+import numpy as np
+from lib.saxutil.txt_proc import tkn_transform
+
+ID_DTYPE = np.int32
+
+
+def _obj_arr(objs):
+    # assigning a slice would make numpy unpack tuple tags
+    arr = np.empty(len(objs), dtype=object)
+    for i in range(len(objs)):
+        arr[i] = objs[i]
+    return arr
+
+
+class TknVocab(object):
+    """
+    Interns token strings to consecutive integer ids, starting at 0.
+    """
+    def __init__(self):
+        self.tkns = []
+        self.id_on_tkn = {}
+
+    def __len__(self):
+        return len(self.tkns)
+
+    def get_id(self, tkn):
+        """
+        :type tkn: str
+        :rtype: int
+        """
+        return self.id_on_tkn.get(tkn)
+
+    def get_id_add_on_absent(self, tkn):
+        """
+        :type tkn: str
+        :rtype: int
+        """
+        i = self.id_on_tkn.get(tkn)
+        if i is None:
+            i = len(self.tkns)
+            self.id_on_tkn[tkn] = i
+            self.tkns.append(tkn)
+        return i
+
+    def intern(self, tkns):
+        """
+        :type tkns: list<str>
+        :rtype: numpy.ndarray
+        """
+        get = self.id_on_tkn.get
+        add = self.get_id_add_on_absent
+        ids = np.empty(len(tkns), dtype=ID_DTYPE)
+        for k in range(len(tkns)):
+            i = get(tkns[k])
+            ids[k] = add(tkns[k]) if i is None else i
+        return ids
+
+    def tkns_of(self, ids):
+        """
+        :type ids: numpy.ndarray
+        :rtype: list<str>
+        """
+        tkns = self.tkns
+        return [tkns[i] for i in ids.tolist()]
+
+
+class _IdSection(object):
+    """
+    Consecutive transformers that ignore tags, compiled to one lookup
+    table over the vocabulary. table[i] is the id the section turns token
+    i into, or -1 when a filter rejects it. Entries are computed the first
+    time a document holds ids past the end of the table.
+    """
+    def __init__(self, trs, vocab):
+        """
+        :type trs: list<TransformBase>
+        :type vocab: TknVocab
+        """
+        self.trs = trs
+        self.vocab = vocab
+        self.tkn_func = tkn_transform._mk_section_func(trs)
+        self.table = np.empty(1024, dtype=ID_DTYPE)
+        self.size = 0
+
+    def reset(self):
+        self.size = 0
+
+    def _extend(self, end):
+        if end > len(self.table):
+            table = np.empty(max(end, 2 * len(self.table)), dtype=ID_DTYPE)
+            table[:self.size] = self.table[:self.size]
+            self.table = table
+        tkns = self.vocab.tkns
+        add = self.vocab.get_id_add_on_absent
+        for i in range(self.size, end):
+            # outputs may add ids past "end". They are computed once a later
+            # document is passed through this section.
+            res = self.tkn_func(tkns[i], None)
+            self.table[i] = -1 if res is None else add(res[0])
+        self.size = end
+
+    def run(self, ids, tags):
+        """
+        :type ids: numpy.ndarray
+        :type tags: numpy.ndarray
+        :param tags: object array, or None
+        """
+        if len(ids) == 0:
+            return ids, tags
+        end = int(ids.max()) + 1
+        if end > self.size:
+            self._extend(end)
+        out = self.table[ids]
+        keep = out >= 0
+        if keep.all():
+            return out, tags
+        return out[keep], None if tags is None else tags[keep]
+
+
+class IdPipeline(object):
+    """
+    Runs a pipeline over documents interned to numpy arrays of token ids.
+    Consecutive transformers whose "uses_tags" is False (LowerCaseReplacer,
+    StemReplacer, NumberReplacer, StopWordFilter, NumberFilter, PuncFilter,
+    AbbrvFilter) are fused into one id -> id table, with -1 for rejected
+    tokens, that is filled in once per vocabulary entry. Running such a
+    section over a document is then a numpy gather and compress. Other
+    transformers, such as LemmaReplacer or MatchGeneralizeTransformer, run
+    on the token strings and their output is interned again.
+
+    The output is the same as run_pipeline with the same transformers. The
+    vocabulary and tables only grow, so call "reset" between unrelated
+    corpora if memory matters.
+
+    EXAMPLE
+    -------
+    ip = IdPipeline([LowerCaseReplacer(), StopWordFilter(stops)])
+    ids = ip.vocab.intern(['The', 'Dog'])
+    ids, tags = ip.run_ids(ids)
+    ip.vocab.tkns_of(ids)
+    # -> ['dog']
+    -------
+    """
+    def __init__(self, transformers, vocab=None):
+        """
+        :type transformers: list<obj>
+        :type vocab: TknVocab
+        """
+        self.transformers = list(transformers)
+        self.vocab = TknVocab() if vocab is None else vocab
+        self.sections = []
+        trs = []
+        for tr in self.transformers:
+            stage = tr.tkn_stage() if hasattr(tr, 'tkn_stage') else None
+            if stage is not None and not getattr(tr, 'uses_tags', True):
+                trs.append(tr)
+                continue
+            if len(trs) > 0:
+                self.sections.append(_IdSection(trs, self.vocab))
+                trs = []
+            self.sections.append(tr)
+        if len(trs) > 0:
+            self.sections.append(_IdSection(trs, self.vocab))
+
+    def reset(self):
+        """
+        Drop the vocabulary and every computed table entry.
+        """
+        self.vocab.__init__()
+        for sec in self.sections:
+            if isinstance(sec, _IdSection):
+                sec.reset()
+
+    def run_ids(self, ids, tags=None):
+        """
+        :type ids: numpy.ndarray
+        :param ids: ids from self.vocab
+        :type tags: list<str>
+        :rtype: tuple(numpy.ndarray, numpy.ndarray,)
+        :returns: ids and an object array of tags, or None if "tags" is None
+        """
+        if tags is not None:
+            if len(ids) != len(tags):
+                raise ValueError('len(ids) != len(tags)')
+            tags = _obj_arr(tags)
+        for sec in self.sections:
+            if isinstance(sec, _IdSection):
+                ids, tags = sec.run(ids, tags)
+                continue
+            _tkns, _tags = sec.run(
+                self.vocab.tkns_of(ids),
+                None if tags is None else list(tags)
+            )
+            ids = self.vocab.intern(_tkns)
+            tags = _obj_arr(_tags)
+        return ids, tags
+
+    def run(self, tkns, tags=None):
+        """
+        :type tkns: list<str>
+        :type tags: list<str>
+        :rtype: tuple(list<str>, list<str>,)
+        """
+        ids, _tags = self.run_ids(self.vocab.intern(tkns), tags)
+        if _tags is None:
+            _tags = [None] * len(ids)
+        return self.vocab.tkns_of(ids), list(_tags)
@@ -0,0 +1,101 @@
+"""
+Precomputed (token, WordNet POS) -> lemma lookup tables for LemmaReplacer.
+
+A table is built once from WordNet by running WordNetLemmatizer over every
+WordNet lemma name, the inflected forms the morphy suffix rules map back to
+it, the irregular forms in the WordNet exception lists and any extra tokens
+given. Every lemma in the table comes from the lemmatizer itself, so a
+LemmaReplacer reading from the table returns the same lemmas as one calling
+the lemmatizer.
+
+The saved format is gzipped text. Each POS starts with a "#<pos>" line,
+followed by one "token<TAB>lemma" line per token. The lemma is left empty
+when it equals the token, which is the case for most entries.
+"""
+import gzip
+from nltk.stem import WordNetLemmatizer
+
+WN_POSES = ('n', 'v', 'a', 'r',)
+
+
+def _inflections(lemma, subs):
+    """
+    :type lemma: str
+    :type subs: list<tuple(str, str,)>
+    :param subs: (suffix, ending) morphy rules for one POS
+    :rtype: list<str>
+    """
+    forms = []
+    for suffix, ending in subs:
+        if lemma.endswith(ending):
+            forms.append(lemma[:len(lemma) - len(ending)] + suffix)
+    return forms
+
+
+def wordnet_tkns(wn, pos):
+    """
+    :type wn: nltk.corpus.reader.wordnet.WordNetCorpusReader
+    :type pos: str
+    :rtype: set<str>
+    """
+    subs = wn.MORPHOLOGICAL_SUBSTITUTIONS.get(pos, [])
+    tkns = set()
+    for lemma in wn.all_lemma_names(pos=pos):
+        tkns.add(lemma)
+        tkns.update(_inflections(lemma, subs))
+    tkns.update(getattr(wn, '_exception_map', {}).get(pos, {}).keys())
+    return tkns
+
+
+def build_lemma_table(extra_tkns=(), wnl=None, wn=None):
+    """
+    :type extra_tkns: iterable<str>
+    :param extra_tkns: tokens to add for every POS, e.g. a corpus vocabulary
+    :type wnl: nltk.stem.WordNetLemmatizer
+    :type wn: nltk.corpus.reader.wordnet.WordNetCorpusReader
+    :rtype: dict<str, dict<str, str>>
+    :returns: lemma on token on WordNet POS
+    """
+    if wnl is None:
+        wnl = WordNetLemmatizer()
+    if wn is None:
+        from nltk.corpus import wordnet as wn
+    extra_tkns = set(extra_tkns)
+    tbl = {}
+    for pos in WN_POSES:
+        tkns = wordnet_tkns(wn, pos) | extra_tkns
+        tbl[pos] = {tkn: wnl.lemmatize(tkn, pos) for tkn in tkns}
+    return tbl
+
+
+def save_lemma_table(tbl, fpath):
+    """
+    :type tbl: dict<str, dict<str, str>>
+    :type fpath: str
+    """
+    with gzip.open(fpath, 'wt', encoding='utf-8') as f:
+        for pos in sorted(tbl):
+            f.write('#' + pos + '\n')
+            for tkn in sorted(tbl[pos]):
+                lemma = tbl[pos][tkn]
+                if '\t' in tkn or '\n' in tkn or '\n' in lemma:
+                    continue
+                f.write(tkn + '\t' + ('' if lemma == tkn else lemma) + '\n')
+
+
+def load_lemma_table(fpath):
+    """
+    :type fpath: str
+    :rtype: dict<str, dict<str, str>>
+    """
+    tbl = {}
+    lemma_on_tkn = None
+    with gzip.open(fpath, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('#') and '\t' not in line:
+                lemma_on_tkn = tbl.setdefault(line[1:], {})
+                continue
+            tkn, lemma = line.split('\t')
+            lemma_on_tkn[tkn] = lemma if lemma else tkn
+    return tbl
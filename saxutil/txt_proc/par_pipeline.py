@@ -0,0 +1,110 @@
+import multiprocessing
+from collections import deque
+from lib.saxutil.txt_proc import tkn_transform
+
+
+def doc_weight(doc, tokenize_method=None):
+    """
+    Number of tokens in a document, or an estimate for a document that has
+    not been tokenized yet.
+
+    :type doc: obj
+    :param doc: as taken by tkn_transform.iter_pipeline
+    :type tokenize_method: function
+    :rtype: int
+    """
+    if tokenize_method is not None:
+        return doc.count(' ') + 1
+    if tkn_transform._is_tkn_tag_pair(doc):
+        return len(doc[0])
+    return len(doc)
+
+
+def chunk_docs(docs, chunk_tkns=50000, tokenize_method=None):
+    """
+    Group documents into chunks holding about "chunk_tkns" tokens each, so
+    a chunk of long documents holds fewer of them than a chunk of short
+    ones.
+
+    :type docs: iterable
+    :type chunk_tkns: int
+    :type tokenize_method: function
+    :rtype: generator<list>
+    """
+    chunk, numtkns = [], 0
+    for doc in docs:
+        chunk.append(doc)
+        numtkns += doc_weight(doc, tokenize_method)
+        if numtkns >= chunk_tkns:
+            yield chunk
+            chunk, numtkns = [], 0
+    if len(chunk) > 0:
+        yield chunk
+
+
+_worker_pipe = None
+
+
+def _init_worker(pipe, tokenize_method):
+    global _worker_pipe
+    _worker_pipe = (pipe, tokenize_method,)
+
+
+def _worker_run_chunk(chunk):
+    return list(tkn_transform.iter_pipeline(
+        _worker_pipe[0], chunk, _worker_pipe[1]
+    ))
+
+
+def iter_pipeline_par(
+    transformers, docs, tokenize_method=None, numprocs=None,
+    chunk_tkns=50000, start_method=None
+):
+    """
+    tkn_transform.iter_pipeline spread over worker processes. The pipeline
+    is sent to each worker once, when the pool starts, and documents are
+    sent in chunks of about "chunk_tkns" tokens. Results are yielded in
+    input order. At most two chunks per worker are in flight, so "docs" is
+    read only slightly ahead of the caller.
+
+    EXAMPLE
+    -------
+    res = list(iter_pipeline_par(pipe, zip(tkn_lil, tag_lil), numprocs=8))
+    -------
+
+    :type transformers: list<obj>
+    :param transformers: must pickle when "start_method" is 'spawn'
+    :type docs: iterable
+    :type tokenize_method: function
+    :type numprocs: int
+    :param numprocs: defaults to the number of cores. With 1, no pool is
+        started.
+    :type chunk_tkns: int
+    :type start_method: str
+    :param start_method: 'fork', 'spawn', 'forkserver' or None for the
+        platform default
+    :rtype: generator<tuple(list<str>, list<str>,)>
+    """
+    if numprocs is None:
+        numprocs = multiprocessing.cpu_count()
+    if numprocs <= 1:
+        for res in tkn_transform.iter_pipeline(
+            transformers, docs, tokenize_method
+        ):
+            yield res
+        return
+
+    ctx = multiprocessing.get_context(start_method)
+    with ctx.Pool(
+        numprocs, initializer=_init_worker,
+        initargs=(transformers, tokenize_method,)
+    ) as pool:
+        pending = deque()
+        for chunk in chunk_docs(docs, chunk_tkns, tokenize_method):
+            pending.append(pool.apply_async(_worker_run_chunk, (chunk,)))
+            if len(pending) >= 2 * numprocs:
+                for res in pending.popleft().get():
+                    yield res
+        while len(pending) > 0:
+            for res in pending.popleft().get():
+                yield res
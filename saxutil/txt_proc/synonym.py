@@ -1,6 +1,10 @@
 import io
+import os
 import csv
-from lib.saxutil import pair_range_util
+import json
+import struct
+import hashlib
+import numpy as np
 
 
 def default_match_genr_postag_method(from_tags, to_size):
@@ -15,6 +19,97 @@ def default_match_genr_postag_method(from_tags, to_size):
         return [from_tags[-1]] * to_size
 
 
+class TknAutomaton(object):
+    """
+    Token level Aho-Corasick automaton. Every ngram added is found in a
+    single left to right pass over a token sequence, no matter how many
+    ngrams there are.
+
+    States are list indices. State 0 is the root. "goto" holds the trie
+    edges, "fail" the longest proper suffix state, and "out_link" the
+    nearest suffix state that ends an ngram.
+    """
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.depth = [0]
+        self.is_end = [False]
+        self.out_link = [0]
+        self.is_built = True
+
+    def _new_state(self, depth):
+        self.goto.append({})
+        self.fail.append(0)
+        self.depth.append(depth)
+        self.is_end.append(False)
+        self.out_link.append(0)
+        return len(self.goto) - 1
+
+    def add(self, ngram):
+        """
+        :type ngram: tuple<str>
+        """
+        if len(ngram) == 0:
+            raise ValueError('ngram is empty')
+        state = 0
+        for tkn in ngram:
+            nxt = self.goto[state].get(tkn)
+            if nxt is None:
+                nxt = self._new_state(self.depth[state] + 1)
+                self.goto[state][tkn] = nxt
+            state = nxt
+        self.is_end[state] = True
+        self.is_built = False
+
+    def build(self):
+        """
+        Compute the failure and output links. This is done lazily by
+        "iter_matches" after ngrams are added.
+        """
+        queue = list(self.goto[0].values())
+        for child in queue:
+            self.fail[child] = 0
+            self.out_link[child] = 0
+        qix = 0
+        while qix < len(queue):
+            state = queue[qix]
+            qix += 1
+            for tkn, child in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f != 0 and tkn not in self.goto[f]:
+                    f = self.fail[f]
+                f = self.goto[f].get(tkn, 0)
+                self.fail[child] = f
+                if self.is_end[f]:
+                    self.out_link[child] = f
+                else:
+                    self.out_link[child] = self.out_link[f]
+        self.is_built = True
+
+    def iter_matches(self, tkns):
+        """
+        :type tkns: list<str>
+        :rtype: generator<tuple(int, int,)>
+        :returns: inclusive (start, end) bounds of every ngram occurrence,
+            ordered by end
+        """
+        if not self.is_built:
+            self.build()
+        goto, fail, depth = self.goto, self.fail, self.depth
+        is_end, out_link = self.is_end, self.out_link
+        state = 0
+        for i in range(len(tkns)):
+            tkn = tkns[i]
+            while state != 0 and tkn not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(tkn, 0)
+            match = state if is_end[state] else out_link[state]
+            while match != 0:
+                yield (i - depth[match] + 1, i,)
+                match = out_link[match]
+
+
 class MatchGeneralizer(object):
     """
     A MatchGeneralizer instance remaps the values of a token or sequence of
@@ -26,7 +121,7 @@ class MatchGeneralizer(object):
     In that example I go over the code step by step.
     """
     def __init__(self, case_sensitive=False):
-        self.from_ngrams_on_start = {}
+        self.automaton = TknAutomaton()
         self.to_ngram_on_from_ngram = {}
         self.set_postag_method(default_match_genr_postag_method)
         self.case_sensitive = case_sensitive
@@ -43,6 +138,10 @@ class MatchGeneralizer(object):
             from_ngram = tuple([t.lower() for t in from_ngram])
             to_ngram = tuple([t.lower() for t in to_ngram])
         from_ngram, to_ngram = tuple(from_ngram), tuple(to_ngram)
+        if len(from_ngram) == 0:
+            raise ValueError('FROM ngram is empty')
+        if isinstance(self.automaton, CompiledTknAutomaton):
+            self._thaw()
         current_to_ngram = self.to_ngram_on_from_ngram.get(from_ngram)
         if current_to_ngram is not None:
             raise ValueError(
@@ -50,39 +149,43 @@ class MatchGeneralizer(object):
                 ','.join([str(i) for i in to_ngram])
             )
         self.to_ngram_on_from_ngram[from_ngram] = to_ngram
-        from_set = self.from_ngrams_on_start.get(from_ngram[0], set())
-        from_set.add(from_ngram)
-        self.from_ngrams_on_start[from_ngram[0]] = from_set
+        self.automaton.add(from_ngram)
+
+    def _thaw(self):
+        """
+        Replace a compiled, read only dictionary with an editable one.
+        """
+        items = list(self.to_ngram_on_from_ngram.items())
+        self.automaton = TknAutomaton()
+        self.to_ngram_on_from_ngram = {}
+        for from_ngram, to_ngram in items:
+            self.to_ngram_on_from_ngram[from_ngram] = to_ngram
+            self.automaton.add(from_ngram)
 
     def match_bounds(self, tkns):
         """
+        Find the longest non-overlapping FROM ngram matches. All matches are
+        found in one pass of the automaton. Longer matches are then kept
+        over the shorter matches they overlap, and between overlapping
+        matches of the same length the leftmost is kept.
+
         :type tkns: list<str>
+        :rtype: list<tuple(int, int,)>
+        :returns: inclusive (start, end) bounds ordered by start
         """
+        matches = list(self.automaton.iter_matches(tkns))
+        if len(matches) == 0:
+            return []
+        matches.sort(key=lambda b: (b[0] - b[1], b[0],))
+        taken = [False] * len(tkns)
         bnds = []
-        for i in range(len(tkns)):
-            candidate_ngrams = self.from_ngrams_on_start.get(tkns[i])
-            if candidate_ngrams is None:
+        for beg, end in matches:
+            if any(taken[beg:end + 1]):
                 continue
-
-            match_ngrams = []
-            for ng in candidate_ngrams:
-                if i + len(ng) - 1 > len(tkns):
-                    # ngram length exceeds the remaining length of the
-                    # token sequence.
-                    continue
-                if tuple(tkns[i:i + len(ng)]) == ng:
-                    match_ngrams.append(ng)
-
-            for ng in match_ngrams:
-                if tuple(tkns[i:i + len(ng)]) in candidate_ngrams:
-                    bnds.append((i, i + len(ng) - 1,))
-
-        subsumed = pair_range_util.subsumed_bound_indices(bnds)
-        bounds_filt = []
-        for i in range(len(bnds)):
-            if i not in subsumed:
-                bounds_filt.append(bnds[i])
-        return bounds_filt
+            taken[beg:end + 1] = [True] * (end - beg + 1)
+            bnds.append((beg, end,))
+        bnds.sort()
+        return bnds
 
     def run(self, tkns, tags=None):
         """
@@ -149,7 +252,320 @@ class MatchGeneralizer(object):
         return mg
 
     @classmethod
-    def load_from_file(cls, fpath):
+    def load_from_file(cls, fpath, compiled_fpath=None):
+        """
+        :type fpath: str
+        :param fpath: TSV file in the "dumps" format
+        :type compiled_fpath: str
+        :param compiled_fpath: if given, the compiled form of "fpath" is
+            loaded from here. It is (re)written when missing or stale.
+        :rtype: MatchGeneralizer
+        """
+        if compiled_fpath is not None:
+            try:
+                return MatchGeneralizer.load_compiled(compiled_fpath, fpath)
+            except (IOError, ValueError, struct.error):
+                # missing, stale, truncated or corrupt
+                MatchGeneralizer.compile_file(fpath, compiled_fpath)
+                return MatchGeneralizer.load_compiled(compiled_fpath)
         with open(fpath) as f:
             mg = MatchGeneralizer.loads(f.read())
         return mg
+
+    @classmethod
+    def compile_file(cls, fpath, compiled_fpath, case_sensitive=False):
+        """
+        Write the normalized dictionary in the TSV file "fpath" and its
+        matching automaton to the binary file "compiled_fpath". The hash of
+        "fpath" is stored so a stale compiled file can be detected.
+
+        :type fpath: str
+        :type compiled_fpath: str
+        :type case_sensitive: bool
+        """
+        with open(fpath, 'rb') as f:
+            dta = f.read()
+        mg = MatchGeneralizer.loads(
+            dta.decode('utf-8'), case_sensitive=case_sensitive
+        )
+        write_compiled(mg, compiled_fpath, hashlib.sha256(dta).hexdigest())
+
+    @classmethod
+    def load_compiled(cls, compiled_fpath, fpath=None):
+        """
+        Load a file written by "compile_file". The automaton arrays are
+        memory mapped and only the vocabulary is read up front.
+
+        :type compiled_fpath: str
+        :type fpath: str
+        :param fpath: if given, a ValueError is raised when the compiled
+            file was not built from the current contents of this file
+        :rtype: MatchGeneralizer
+        """
+        automaton = CompiledTknAutomaton(compiled_fpath)
+        if fpath is not None:
+            with open(fpath, 'rb') as f:
+                src_hash = hashlib.sha256(f.read()).hexdigest()
+            if src_hash != automaton.header['src_hash']:
+                raise ValueError(
+                    'compiled file is stale:\t' + str(compiled_fpath)
+                )
+        mg = MatchGeneralizer(
+            case_sensitive=automaton.header['case_sensitive']
+        )
+        mg.automaton = automaton
+        mg.to_ngram_on_from_ngram = CompiledNgramMap(automaton)
+        return mg
+
+
+COMPILED_MAGIC = b'MGC1'
+COMPILED_ARRS = (
+    ('edge_begs', '<i8',),
+    ('edge_tkns', '<i4',),
+    ('edge_dsts', '<i4',),
+    ('fail', '<i4',),
+    ('out_link', '<i4',),
+    ('depth', '<i4',),
+    ('is_end', '|u1',),
+    ('parent', '<i4',),
+    ('parent_tkn', '<i4',),
+    ('to_begs', '<i8',),
+    ('to_tkns', '<i4',),
+    ('vocab', '|u1',),
+)
+
+
+def write_compiled(mg, fpath, src_hash):
+    """
+    Compiled file layout: magic bytes, the header length as a uint64, a json
+    header, then each array of COMPILED_ARRS at an 8 byte aligned offset.
+    The vocabulary is stored as null separated utf-8 tokens.
+
+    :type mg: MatchGeneralizer
+    :type fpath: str
+    :type src_hash: str
+    """
+    am = mg.automaton
+    if isinstance(am, CompiledTknAutomaton):
+        mg._thaw()
+        am = mg.automaton
+    if not am.is_built:
+        am.build()
+    numstates = len(am.goto)
+
+    tkns = []
+    id_on_tkn = {}
+
+    def tkn_id(tkn):
+        if tkn not in id_on_tkn:
+            id_on_tkn[tkn] = len(tkns)
+            tkns.append(tkn)
+        return id_on_tkn[tkn]
+
+    arr_on_name = {}
+    edge_begs = np.zeros(numstates + 1, dtype=np.int64)
+    edge_tkns, edge_dsts = [], []
+    parent = np.zeros(numstates, dtype=np.int32)
+    parent_tkn = np.full(numstates, -1, dtype=np.int32)
+    for state in range(numstates):
+        for tkn, dst in am.goto[state].items():
+            edge_tkns.append(tkn_id(tkn))
+            edge_dsts.append(dst)
+            parent[dst] = state
+            parent_tkn[dst] = edge_tkns[-1]
+        edge_begs[state + 1] = len(edge_tkns)
+    arr_on_name['edge_begs'] = edge_begs
+    arr_on_name['edge_tkns'] = edge_tkns
+    arr_on_name['edge_dsts'] = edge_dsts
+    arr_on_name['fail'] = am.fail
+    arr_on_name['out_link'] = am.out_link
+    arr_on_name['depth'] = am.depth
+    arr_on_name['is_end'] = am.is_end
+    arr_on_name['parent'] = parent
+    arr_on_name['parent_tkn'] = parent_tkn
+
+    to_begs = np.zeros(numstates + 1, dtype=np.int64)
+    to_tkns = []
+    for state in range(numstates):
+        if am.is_end[state]:
+            from_ngram = _ngram_from_state(state, parent, parent_tkn, tkns)
+            to_ngram = mg.to_ngram_on_from_ngram[from_ngram]
+            to_tkns.extend([tkn_id(t) for t in to_ngram])
+        to_begs[state + 1] = len(to_tkns)
+    arr_on_name['to_begs'] = to_begs
+    arr_on_name['to_tkns'] = to_tkns
+    for tkn in tkns:
+        if '\x00' in tkn:
+            raise ValueError('tokens cannot contain null characters')
+    arr_on_name['vocab'] = np.frombuffer(
+        '\x00'.join(tkns).encode('utf-8'), dtype=np.uint8
+    )
+
+    header = {
+        'src_hash': src_hash,
+        'case_sensitive': mg.case_sensitive,
+        'numtkns': len(tkns),
+        'arrs': [],
+    }
+    blobs = []
+    offset = 0
+    for name, dtype in COMPILED_ARRS:
+        arr = np.asarray(arr_on_name[name], dtype=dtype)
+        header['arrs'].append([name, dtype, offset, len(arr)])
+        blob = arr.tobytes()
+        blob += b'\x00' * (-len(blob) % 8)
+        blobs.append(blob)
+        offset += len(blob)
+    header_blob = json.dumps(header).encode('utf-8')
+    header_blob += b' ' * (-(len(header_blob) + 12) % 8)
+    # written to a temporary file that replaces "fpath" once complete, so
+    # processes that have the old file memory mapped keep a valid mapping
+    # and a failed write never leaves a truncated file behind
+    tmp_fpath = fpath + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(tmp_fpath, 'wb') as f:
+            f.write(COMPILED_MAGIC)
+            f.write(struct.pack('<Q', len(header_blob)))
+            f.write(header_blob)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_fpath, fpath)
+    except BaseException:
+        if os.path.exists(tmp_fpath):
+            os.remove(tmp_fpath)
+        raise
+
+
+def _ngram_from_state(state, parent, parent_tkn, tkns):
+    ngram = []
+    while state != 0:
+        ngram.append(tkns[parent_tkn[state]])
+        state = parent[state]
+    ngram.reverse()
+    return tuple(ngram)
+
+
+class CompiledTknAutomaton(object):
+    """
+    Read only TknAutomaton loaded from a file written by write_compiled.
+    The state arrays are memory mapped. The edges of a state are turned
+    into a dict the first time the state is visited.
+    """
+    def __init__(self, fpath):
+        """
+        :type fpath: str
+        """
+        with open(fpath, 'rb') as f:
+            if f.read(len(COMPILED_MAGIC)) != COMPILED_MAGIC:
+                raise ValueError('not a compiled MatchGeneralizer file')
+            header_len = struct.unpack('<Q', f.read(8))[0]
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+        data_offset = len(COMPILED_MAGIC) + 8 + header_len
+        for name, dtype, offset, count in self.header['arrs']:
+            if count == 0:
+                arr = np.zeros(0, dtype=dtype)
+            else:
+                arr = np.memmap(
+                    fpath, dtype=dtype, mode='r',
+                    offset=data_offset + offset, shape=(count,)
+                )
+            setattr(self, name, arr)
+        if self.header['numtkns'] == 0:
+            self.tkns = []
+        else:
+            self.tkns = self.vocab.tobytes().decode('utf-8').split('\x00')
+        self.id_on_tkn = dict(zip(self.tkns, range(len(self.tkns))))
+        self._goto_cache = {}
+        self.is_built = True
+
+    def num_states(self):
+        return len(self.fail)
+
+    def goto(self, state):
+        """
+        :type state: int
+        :rtype: dict<int, int>
+        :returns: destination state on token id
+        """
+        edges = self._goto_cache.get(state)
+        if edges is None:
+            beg, end = self.edge_begs[state], self.edge_begs[state + 1]
+            edges = dict(zip(
+                self.edge_tkns[beg:end].tolist(),
+                self.edge_dsts[beg:end].tolist()
+            ))
+            self._goto_cache[state] = edges
+        return edges
+
+    def find_state(self, ngram):
+        """
+        :type ngram: tuple<str>
+        :rtype: int
+        :returns: state reached by "ngram", or None
+        """
+        state = 0
+        for tkn in ngram:
+            tid = self.id_on_tkn.get(tkn)
+            state = self.goto(state).get(tid)
+            if state is None:
+                return None
+        return state
+
+    def iter_matches(self, tkns):
+        """
+        See TknAutomaton.iter_matches
+        """
+        fail, depth = self.fail, self.depth
+        is_end, out_link = self.is_end, self.out_link
+        id_on_tkn = self.id_on_tkn
+        state = 0
+        for i in range(len(tkns)):
+            tid = id_on_tkn.get(tkns[i])
+            if tid is None:
+                state = 0
+                continue
+            while state != 0 and tid not in self.goto(state):
+                state = int(fail[state])
+            state = self.goto(state).get(tid, 0)
+            match = state if is_end[state] else int(out_link[state])
+            while match != 0:
+                yield (i - int(depth[match]) + 1, i,)
+                match = int(out_link[match])
+
+
+class CompiledNgramMap(object):
+    """
+    Read only stand in for MatchGeneralizer.to_ngram_on_from_ngram backed by
+    a CompiledTknAutomaton.
+    """
+    def __init__(self, automaton):
+        self.am = automaton
+
+    def _to_ngram(self, state):
+        beg, end = self.am.to_begs[state], self.am.to_begs[state + 1]
+        return tuple([self.am.tkns[t] for t in self.am.to_tkns[beg:end]])
+
+    def get(self, from_ngram, default=None):
+        state = self.am.find_state(from_ngram)
+        if state is None or not self.am.is_end[state]:
+            return default
+        return self._to_ngram(state)
+
+    def __getitem__(self, from_ngram):
+        to_ngram = self.get(from_ngram)
+        if to_ngram is None:
+            raise KeyError(from_ngram)
+        return to_ngram
+
+    def __contains__(self, from_ngram):
+        return self.get(from_ngram) is not None
+
+    def __len__(self):
+        return int(self.am.is_end.sum())
+
+    def items(self):
+        for state in np.nonzero(self.am.is_end)[0].tolist():
+            from_ngram = _ngram_from_state(
+                state, self.am.parent, self.am.parent_tkn, self.am.tkns
+            )
+            yield from_ngram, self._to_ngram(state)
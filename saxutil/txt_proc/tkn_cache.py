@@ -0,0 +1,197 @@
+import json
+from collections import OrderedDict
+
+
+class TknCache(object):
+    """
+    Bounded memo of per token transformer results, keyed by the processor
+    arguments: (token, tag) for tkn_processor, where the token still holds
+    its flag, and (base token, flag, tag) for split_tkn_processor. Attach
+    one to a transformer with TransformBase.set_cache. Since the keys do not
+    name the transformer, a cache belongs to one transformer at a time:
+    "owner" is set by set_cache and released by clear_cache.
+
+    "policy" picks what is evicted once "maxsize" entries are held:
+    'lru' drops the least recently used entry, 'lfu' drops the least
+    frequently used tenth of the entries at once.
+
+    A cache is a plain picklable object, so it travels with its transformer
+    to worker processes. Each process then has its own copy; the "dumps"
+    table of the most used entries can be used to prewarm them.
+
+    EXAMPLE
+    -------
+    stemr = StemReplacer()
+    stemr.set_cache(TknCache(maxsize=50000))
+    run_pipeline([stemr], tkns)
+    stemr.cache.hit_rate()
+    -------
+    """
+    def __init__(self, maxsize=100000, policy='lru'):
+        """
+        :type maxsize: int
+        :type policy: str
+        """
+        if policy not in ('lru', 'lfu',):
+            raise ValueError('policy must be "lru" or "lfu"')
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.owner = None
+        self.vals = OrderedDict()
+        self.cnts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.vals)
+
+    def clear(self):
+        self.vals = OrderedDict()
+        self.cnts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """
+        :rtype: float
+        """
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / float(total)
+
+    def stats(self):
+        """
+        :rtype: dict<str, obj>
+        """
+        return {
+            'size': len(self.vals),
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+        }
+
+    def lookup(self, key, func):
+        """
+        :type key: tuple
+        :type func: function
+        :param func: called with *key when key is not cached
+        """
+        try:
+            val = self.vals[key]
+        except KeyError:
+            self.misses += 1
+            val = func(*key)
+            self.put(key, val)
+            return val
+        self.hits += 1
+        self.cnts[key] += 1
+        if self.policy == 'lru':
+            self.vals.move_to_end(key)
+        return val
+
+    def put(self, key, val, cnt=1):
+        """
+        :type key: tuple
+        :type val: obj
+        :type cnt: int
+        """
+        if key not in self.vals and len(self.vals) >= self.maxsize:
+            self._evict()
+        self.vals[key] = val
+        self.cnts[key] = self.cnts.get(key, 0) + cnt
+
+    def _evict(self):
+        if self.policy == 'lru':
+            key, val = self.vals.popitem(last=False)
+            del self.cnts[key]
+            return
+        numdrop = max(1, len(self.vals) // 10)
+        keys = sorted(self.cnts, key=self.cnts.get)[:numdrop]
+        for key in keys:
+            del self.vals[key]
+            del self.cnts[key]
+
+    def top_items(self, n=None):
+        """
+        :type n: int
+        :rtype: list<tuple(tuple, obj, int,)>
+        :returns: (key, value, use count) of the n most used entries
+        """
+        keys = sorted(self.cnts, key=lambda k: -self.cnts[k])
+        if n is not None:
+            keys = keys[:n]
+        return [(k, self.vals[k], self.cnts[k],) for k in keys]
+
+    def prewarm(self, items):
+        """
+        :type items: list<tuple(tuple, obj, int,)>
+        :param items: output of "top_items" or "loads"
+        """
+        for key, val, cnt in items:
+            self.put(key, val, cnt)
+
+
+def dumps(cache, n=None):
+    """
+    :type cache: TknCache
+    :type n: int
+    :param n: only the n most used entries are kept
+    :rtype: str
+    """
+    return json.dumps([
+        [list(k), list(v) if isinstance(v, tuple) else v, c]
+        for k, v, c in cache.top_items(n)
+    ])
+
+
+def loads(dta):
+    """
+    :type dta: str
+    :rtype: list<tuple(tuple, obj, int,)>
+    :returns: items for TknCache.prewarm
+    """
+    return [
+        (tuple(k), tuple(v) if isinstance(v, list) else v, c,)
+        for k, v, c in json.loads(dta)
+    ]
+
+
+class CachedProcessor(object):
+    """
+    Stands in for a transformer's tkn_processor or split_tkn_processor and
+    sends calls through a TknCache. It looks the method up on the class so
+    that it still pickles when it replaces the instance attribute.
+    """
+    def __init__(self, tr, method_name, numargs, cache):
+        """
+        :type tr: TransformBase
+        :type method_name: str
+        :type numargs: int
+        :param numargs: number of processor arguments, tag included
+        :type cache: TknCache
+        """
+        self.tr = tr
+        self.method_name = method_name
+        self.numargs = numargs
+        self.cache = cache
+        self._func = getattr(type(tr), method_name).__get__(tr)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_func']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._func = getattr(type(self.tr), self.method_name).__get__(self.tr)
+
+    def __call__(self, *args):
+        if len(args) < self.numargs:
+            # the tag was left to its default
+            args = args + (None,)
+        return self.cache.lookup(args, self._func)
@@ -1,7 +1,11 @@
 import re
+import time
 #from nltk.corpus import wordnet
 from nltk.stem import PorterStemmer, WordNetLemmatizer
+from lib.saxutil import instrument
 from lib.saxutil.txt_proc import regexes
+from lib.saxutil.txt_proc import tkn_cache
+from lib.saxutil.txt_proc import lemma_table as lemma_tbl
 
 
 def replace_run(replace_func, tkns, tags=None):
@@ -120,11 +124,18 @@ class FlagSplitter(object):
     """
 
     def __init__(self, flgset):
-        if len(flgset) == 0:
+        # sorted, so the pattern does not depend on set iteration order
+        self.flgs = sorted(flgset)
+        # Lower casing a token that holds no flag can only create one if a
+        # flag has lower case letters
+        self.lower_safe = not any(
+            [c.islower() for flg in self.flgs for c in flg]
+        )
+        if len(self.flgs) == 0:
             self.patt = re.compile('$a')
             return
         pattstr = '('
-        for flg in flgset:
+        for flg in self.flgs:
             pattstr += flg + '|'
         pattstr = pattstr[:-1] + '$)'
         self.patt = re.compile(pattstr)
@@ -137,18 +148,91 @@ class FlagSplitter(object):
 
 
 class TransformBase(object):
+    # False when tkn_processor ignores the tag, so that the result for a
+    # token can be computed once for the whole vocabulary. See id_pipeline.
+    uses_tags = True
+
     def __init__(self, flgset, run_method):
         self.flg_splitr = FlagSplitter(flgset)
         self.run_method = run_method
+        self.cache = None
+
+    def set_cache(self, cache):
+        """
+        Memoize this transformer's per token results. Only worth it for
+        expensive processors such as StemReplacer, LemmaReplacer and
+        NumberReplacer.
+
+        :type cache: tkn_cache.TknCache
+        :param cache: not set on any other transformer
+        """
+        if getattr(type(self), 'tkn_processor', None) is None:
+            raise TypeError(
+                type(self).__name__ + ' has no tkn_processor to cache'
+            )
+        if cache.owner is not None and cache.owner is not self:
+            raise ValueError('cache is already set on another transformer')
+        self.clear_cache()
+        self.cache = cache
+        cache.owner = self
+        self.tkn_processor = tkn_cache.CachedProcessor(
+            self, 'tkn_processor', 2, cache
+        )
+        if hasattr(self, 'split_tkn_processor'):
+            self.split_tkn_processor = tkn_cache.CachedProcessor(
+                self, 'split_tkn_processor', 3, cache
+            )
+
+    def clear_cache(self):
+        """
+        Detach the cache set by "set_cache", if any.
+        """
+        if self.cache is not None and self.cache.owner is self:
+            self.cache.owner = None
+        self.cache = None
+        for name in ('tkn_processor', 'split_tkn_processor',):
+            if name in self.__dict__:
+                del self.__dict__[name]
 
     def run(self, tkns, tags=None):
         return self.run_method(self.tkn_processor, tkns, tags)
 
+    def tkn_stage(self):
+        """
+        Describe this transformer to compile_pipeline.
+
+        :rtype: tuple(str, function,)
+        :returns: "replace" or "filter" and the per token function, or None
+            if the transformer does not work one token at a time
+        """
+        if self.run_method is replace_run:
+            return 'replace', self.tkn_processor
+        if self.run_method is filt_run:
+            return 'filter', self.tkn_processor
+        return None
+
+    def split_tkn_stage(self):
+        """
+        Like tkn_stage, but the function takes a token that has already
+        been split by "flg_splitr": (base token, flag, tag). A replacer
+        returns (base token, flag, tag) equal to what splitting its output
+        token would give, so later stages with the same flags need not
+        split again. A filter returns True to reject.
+
+        :rtype: tuple(str, function,)
+        """
+        stage = self.tkn_stage()
+        if stage is None or not hasattr(self, 'split_tkn_processor'):
+            return None
+        return stage[0], self.split_tkn_processor
+
 
 class LowerCaseReplacer(TransformBase):
     """
     Usage: Replace all tokens with their lower case equivalent.
     """
+    uses_tags = False
+
     def __init__(self, flgset=set()):
         super(LowerCaseReplacer, self).__init__(flgset, replace_run)
 
@@ -156,11 +240,18 @@ class LowerCaseReplacer(TransformBase):
         rtkn, flg = self.flg_splitr.split(tkn)
         return rtkn.lower() + flg, tag
 
+    def split_tkn_processor(self, rtkn, flg, tag=None):
+        if self.flg_splitr.lower_safe:
+            return rtkn.lower(), flg, tag
+        return self.flg_splitr.split(rtkn.lower() + flg) + (tag,)
+
 
 class StemReplacer(TransformBase):
     """
     Usage: Replace all tokens with thier stemmed form.
     """
+    uses_tags = False
+
     def __init__(self, stemmer=PorterStemmer(), flgset=set()):
         super(StemReplacer, self).__init__(flgset, replace_run)
         self.stemmer = stemmer
@@ -169,27 +260,51 @@ class StemReplacer(TransformBase):
         rtkn, flg = self.flg_splitr.split(tkn)
         return self.stemmer.stem(rtkn) + flg, tag
 
+    def split_tkn_processor(self, rtkn, flg, tag=None):
+        # the stemmer's output is not known to be free of flags
+        return self.flg_splitr.split(self.stemmer.stem(rtkn) + flg) + (tag,)
+
 
 class LemmaReplacer(TransformBase):
-    def __init__(self, flgset=set()):
+    """
+    Usage: Replace tokens with their WordNet lemma.
+
+    "lemma_table" is a table from lemma_table.build_lemma_table, or the path
+    of one saved with lemma_table.save_lemma_table. It is loaded here, and
+    the lemmatizer, along with the WordNet corpus, is only used for tokens
+    the table does not hold.
+    """
+    def __init__(self, flgset=set(), lemma_table=None):
         super(LemmaReplacer, self).__init__(flgset, replace_run)
         self.wnl = WordNetLemmatizer()
         self.wn_pos_on_tbnk_pos_start = {
             'A':'a', 'R':'r', 'V':'v'
         }
+        if isinstance(lemma_table, str):
+            lemma_table = lemma_tbl.load_lemma_table(lemma_table)
+        self.lemma_table = lemma_table or {}
 
     def tkn_processor(self, tkn, tag):
         if tag is None or len(tag) == 0:
             raise ValueError('POS tag required')
         wnpos = self.wn_pos_on_tbnk_pos_start.get(tag[0], 'n')
-        rtkn = self.wnl.lemmatize(tkn, wnpos)
+        rtkn = self.lemma_table.get(wnpos, {}).get(tkn)
+        if rtkn is None:
+            rtkn = self.wnl.lemmatize(tkn, wnpos)
         return rtkn, tag
 
+    def split_tkn_processor(self, rtkn, flg, tag):
+        # the lemmatizer is given the whole token, flag included
+        ltkn, tag = self.tkn_processor(rtkn + flg, tag)
+        return self.flg_splitr.split(ltkn) + (tag,)
+
 
 class NumberReplacer(TransformBase):
     """
     Usage: Set all numeric tokens to a uniform string.
     """
+    uses_tags = False
+
     def __init__(self, flgset=set(), replace_with='__numeric'):
         super(NumberReplacer, self).__init__(flgset, replace_run)
         self.replace_with = replace_with
@@ -200,6 +315,13 @@ class NumberReplacer(TransformBase):
             return self.replace_with + flg, tag
         return rtkn + flg, tag
 
+    def split_tkn_processor(self, rtkn, flg, tag=None):
+        if not regexes.IS_NUMERIC_PATT.match(rtkn):
+            return rtkn, flg, tag
+        if self.flg_splitr.split(self.replace_with)[1] == '':
+            return self.replace_with, flg, tag
+        return self.flg_splitr.split(self.replace_with + flg) + (tag,)
+
 
 class TermWithPosReplacer(TransformBase):
     def __init__(self, flgset=set()):
@@ -214,11 +336,19 @@ class TermWithPosReplacer(TransformBase):
         rtkn = self.to_on_from.get( (sptkn, tag,), sptkn )
         return rtkn, tag
 
+    def split_tkn_processor(self, rtkn, flg, tag):
+        # the flag is dropped, so the bare token is split again
+        return self.flg_splitr.split(
+            self.to_on_from.get( (rtkn, tag,), rtkn )
+        ) + (tag,)
+
 
 class StopWordFilter(TransformBase):
     """
     Usage: Remove stopwords
     """
+    uses_tags = False
+
     def __init__(self, stopwords, flgset=set()):
         super(StopWordFilter, self).__init__(flgset, filt_run)
         self.stopwords = set(stopwords)
@@ -229,11 +359,16 @@ class StopWordFilter(TransformBase):
             return True
         return False
 
+    def split_tkn_processor(self, rtkn, flg, tag=None):
+        return rtkn in self.stopwords
+
 
 class NumberFilter(TransformBase):
     """
     Usage: Remove numeric tokens.
     """
+    uses_tags = False
+
     def __init__(self, flgset=set()):
         super(NumberFilter, self).__init__(flgset, filt_run)
 
@@ -243,6 +378,9 @@ class NumberFilter(TransformBase):
             return True
         return False
 
+    def split_tkn_processor(self, rtkn, flg, tag=None):
+        return regexes.IS_NUMERIC_PATT.match(rtkn) is not None
+
 
 class MatchGeneralizeTransformer(object):
     """
@@ -262,6 +400,205 @@ def run_pipeline(transformers, tkns, tags=None):
         tags = [None] * len(tkns)
 
     _tkns, _tags = list(tkns), list(tags)
+    if instrument.is_enabled():
+        return _run_pipeline_instrumented(transformers, _tkns, _tags)
     for tr in transformers:
         _tkns, _tags = tr.run(_tkns, _tags)
     return _tkns, _tags
+
+
+def _run_pipeline_instrumented(transformers, tkns, tags):
+    beg = time.perf_counter()
+    _tkns, _tags = tkns, tags
+    for tr in transformers:
+        _tkns, _tags = instrument.run_stage(
+            'run_pipeline.' + type(tr).__name__, tr.run, _tkns, _tags
+        )
+    instrument.record(
+        'run_pipeline', time.perf_counter() - beg, len(tkns), len(_tkns)
+    )
+    return _tkns, _tags
+
+
+def _is_tkn_tag_pair(doc):
+    return (
+        isinstance(doc, tuple) and len(doc) == 2 and
+        not isinstance(doc[0], str)
+    )
+
+
+def iter_pipeline(transformers, docs, tokenize_method=None):
+    """
+    Lazily run a pipeline over a corpus. Each document is read from "docs"
+    only when the caller asks for its result, and nothing is kept once it
+    has been yielded, so a corpus streamed from disk is processed in
+    constant memory and is read no faster than the caller consumes it.
+
+    EXAMPLE
+    -------
+    docs = (line for line in open('corpus.txt'))
+    for tkns, tags in iter_pipeline(pipe, docs, nltk.word_tokenize):
+        ...
+    -------
+
+    :type transformers: list<obj>
+    :param transformers: a list as for run_pipeline, or an object with a
+        "run" method such as a FusedPipeline
+    :type docs: iterable
+    :param docs: strings, when "tokenize_method" is given, token lists or
+        (tokens, tags) pairs
+    :type tokenize_method: function
+    :rtype: generator<tuple(list<str>, list<str>,)>
+    """
+    if hasattr(transformers, 'run'):
+        run = transformers.run
+    else:
+        def run(tkns, tags):
+            return run_pipeline(transformers, tkns, tags)
+    for doc in docs:
+        if tokenize_method is not None:
+            tkns, tags = tokenize_method(doc), None
+        elif _is_tkn_tag_pair(doc):
+            tkns, tags = doc
+        else:
+            tkns, tags = doc, None
+        yield run(tkns, tags)
+
+
+def _mk_tkn_func(stages):
+    """
+    :type stages: list<tuple(bool, function,)>
+    :param stages: (is filter, per token function) pairs
+    """
+    def tkn_func(tkn, tag):
+        for is_filt, func in stages:
+            if is_filt:
+                if func(tkn, tag):
+                    return None
+            else:
+                tkn, tag = func(tkn, tag)
+        return tkn, tag
+    return tkn_func
+
+
+def _mk_split_tkn_func(flg_splitr, stages):
+    """
+    :type flg_splitr: FlagSplitter
+    :param flg_splitr: splitter shared by every stage
+    :type stages: list<tuple(bool, function,)>
+    :param stages: (is filter, split token function) pairs
+    """
+    split = flg_splitr.split
+
+    def tkn_func(tkn, tag):
+        rtkn, flg = split(tkn)
+        for is_filt, func in stages:
+            if is_filt:
+                if func(rtkn, flg, tag):
+                    return None
+            else:
+                rtkn, flg, tag = func(rtkn, flg, tag)
+        return rtkn + flg, tag
+    return tkn_func
+
+
+def _mk_section_func(trs):
+    """
+    Fuse consecutive per token transformers. When they all split flags the
+    same way, the token is split once on the way in and joined once on the
+    way out.
+
+    :type trs: list<TransformBase>
+    """
+    patts = set([
+        tr.flg_splitr.patt.pattern if hasattr(tr, 'flg_splitr') else None
+        for tr in trs
+    ])
+    split_stages = [
+        tr.split_tkn_stage() if hasattr(tr, 'split_tkn_stage') else None
+        for tr in trs
+    ]
+    if len(patts) == 1 and None not in patts and None not in split_stages:
+        return _mk_split_tkn_func(
+            trs[0].flg_splitr,
+            [(st[0] == 'filter', st[1],) for st in split_stages]
+        )
+    stages = [tr.tkn_stage() for tr in trs]
+    return _mk_tkn_func([(st[0] == 'filter', st[1],) for st in stages])
+
+
+class FusedPipeline(object):
+    """
+    A list of transformers compiled so that consecutive per token
+    transformers run as one function per token instead of one pass over the
+    whole token list per transformer. A token rejected by a filter is not
+    passed to the later transformers, and when the fused transformers share
+    a flag set each token's flag is split off only once. Transformers that
+    work on the whole sequence, such as MatchGeneralizeTransformer, run as
+    they normally do between the fused sections.
+
+    The output is the same as run_pipeline with the same transformers.
+
+    EXAMPLE
+    -------
+    fp = compile_pipeline([LowerCaseReplacer(), StopWordFilter(stops)])
+    tkns, tags = fp.run(['The', 'Dog'])
+    -------
+    """
+    def __init__(self, transformers):
+        """
+        :type transformers: list<obj>
+        """
+        self.transformers = list(transformers)
+        self.sections = []
+        trs = []
+        for tr in self.transformers:
+            stage = tr.tkn_stage() if hasattr(tr, 'tkn_stage') else None
+            if stage is None:
+                if len(trs) > 0:
+                    self.sections.append(_mk_section_func(trs))
+                    trs = []
+                self.sections.append(tr)
+                continue
+            trs.append(tr)
+        if len(trs) > 0:
+            self.sections.append(_mk_section_func(trs))
+
+    def _run_tkn_func(self, tkn_func, tkns, tags):
+        _tkns = [None] * len(tkns)
+        _tags = [None] * len(tkns)
+        k = 0
+        for i in range(len(tkns)):
+            res = tkn_func(tkns[i], tags[i])
+            if res is None:
+                continue
+            _tkns[k], _tags[k] = res
+            k += 1
+        del _tkns[k:]
+        del _tags[k:]
+        return _tkns, _tags
+
+    def run(self, tkns, tags=None):
+        """
+        :type tkns: list<str>
+        :type tags: list<str>
+        """
+        if tags is None:
+            tags = [None] * len(tkns)
+        if len(tkns) != len(tags):
+            raise ValueError('len(tkns) != len(tags)')
+        _tkns, _tags = list(tkns), list(tags)
+        for sec in self.sections:
+            if hasattr(sec, 'run'):
+                _tkns, _tags = sec.run(_tkns, _tags)
+            else:
+                _tkns, _tags = self._run_tkn_func(sec, _tkns, _tags)
+        return _tkns, _tags
+
+
+def compile_pipeline(transformers):
+    """
+    :type transformers: list<obj>
+    :rtype: FusedPipeline
+    """
+    return FusedPipeline(transformers)